@@ -0,0 +1,53 @@
+"""
+Service dependencies for the API routes
+
+Services are built on first use rather than at import time, so workers boot
+quickly and health probes answer before any model client exists.
+"""
+import asyncio
+import logging
+from typing import Annotated
+from fastapi import Depends
+from app.core.exceptions import APIKeyError, create_http_exception
+from app.services.ai_service import AIService, get_ai_service
+from app.services.audio_ingest_service import AudioIngestService, get_audio_ingest_service
+from app.services.audio_service import AudioService, get_audio_service
+from app.services.file_service import FileService, get_file_service
+from app.services.image_service import get_image_service
+
+logger = logging.getLogger(__name__)
+
+async def ai_service_dependency() -> AIService:
+    """The AI service, or 503 when it cannot be built"""
+    try:
+        return get_ai_service()
+    except APIKeyError as e:
+        raise create_http_exception(503, e.message)
+
+AIServiceDep = Annotated[AIService, Depends(ai_service_dependency)]
+AudioServiceDep = Annotated[AudioService, Depends(get_audio_service.dependency)]
+AudioIngestServiceDep = Annotated[AudioIngestService, Depends(get_audio_ingest_service.dependency)]
+FileServiceDep = Annotated[FileService, Depends(get_file_service.dependency)]
+
+async def warm_services() -> None:
+    """Build the AI service and open Groq connections, then keep them warm (runs as a task)"""
+    try:
+        ai_service = get_ai_service()
+    except APIKeyError as e:
+        logger.error(f"AI service unavailable: {e.message}")
+        return
+    await ai_service.warmup()
+    await ai_service.keep_warm()
+
+async def close_services() -> None:
+    """Release pools and connections of the services that were built"""
+    ai_service = get_ai_service.peek()
+    if ai_service is not None:
+        await ai_service.aclose()
+    audio_service = get_audio_service.peek()
+    if audio_service is not None:
+        audio_service.shutdown()
+    for service in (get_image_service.peek(), get_audio_ingest_service.peek()):
+        if service is not None:
+            # Joining the worker processes blocks, so it runs off the event loop
+            await asyncio.to_thread(service.shutdown)
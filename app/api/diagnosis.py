@@ -1,104 +1,529 @@
 """
 Medical diagnosis endpoints
 """
-import os
+import asyncio
+import json
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import Response
-from typing import Optional
-from app.models.schemas import DiagnosisResponse, AudioResponse
-from app.services.ai_service import ai_service
-from app.services.audio_service import audio_service
-from app.services.file_service import file_service
-from app.core.exceptions import create_http_exception
+import orjson
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Optional
+from app.models.schemas import (
+    AudioResponse,
+    BatchDiagnosisResponse,
+    BatchImageResult,
+    DiagnosisResponse,
+    JobStatus
+)
+from app.api.dependencies import (
+    AIServiceDep,
+    AudioIngestServiceDep,
+    AudioServiceDep,
+    FileServiceDep
+)
+from app.services.cache_service import result_cache
+from app.services.job_service import Job, job_service, validate_webhook_url
+from app.services.prompt_templates import prompt_templates
+from app.services.stream_transcription_service import stream_transcription_service
+from app.core.config import settings
+from app.core.rate_limit import admission
+from app.core.exceptions import (
+    FileProcessingError,
+    FileTooLargeError,
+    ImageQualityError,
+    ModelError,
+    RateLimitExceededError,
+    ServiceUnavailableError,
+    create_http_exception
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/diagnosis", tags=["diagnosis"])
 
-@router.post("/analyze", response_model=DiagnosisResponse)
+def _service_unavailable(error: ServiceUnavailableError) -> HTTPException:
+    """Map throttled, saturated or failing models to a fast 429/503 with a retry hint"""
+    status_code = 429 if isinstance(error, RateLimitExceededError) else 503
+    retry_after = error.details.get("retry_after", max(1, int(settings.queue_timeout)))
+    return create_http_exception(
+        status_code,
+        error.message,
+        error.details,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def _invalid_upload(error: FileProcessingError) -> HTTPException:
+    """Map upload validation failures to client errors"""
+    if isinstance(error, FileTooLargeError):
+        status_code = 413
+    elif isinstance(error, ImageQualityError):
+        status_code = 422
+    else:
+        status_code = 400
+    return create_http_exception(status_code, error.message, error.details)
+
+async def _build_diagnosis(diagnosis_text: str, symptoms: Optional[str]) -> DiagnosisResponse:
+    """Wrap model output in the diagnosis response model and store it under its result ID"""
+    # Calculate confidence (simplified - in production, this would be from the model)
+    confidence = 85.0 if symptoms else 75.0
+    result_id = await result_cache.store_result(diagnosis_text, confidence)
+    
+    # The model gives no separate solution yet, so it is omitted rather than repeated
+    return DiagnosisResponse(
+        diagnosis=diagnosis_text,
+        confidence=confidence,
+        audio_available=True,
+        result_id=result_id
+    )
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _result_not_found(result_id: str) -> HTTPException:
+    """404 for an unknown or expired result ID"""
+    return create_http_exception(404, "Result not found or expired", {"result_id": result_id})
+
+def _job_status(job: Job) -> JobStatus:
+    """Public view of a background job"""
+    return JobStatus(**job.to_dict())
+
+async def _check_webhook_url(webhook_url: Optional[str]) -> None:
+    """Only accept http(s) callbacks to allowed or public hosts"""
+    if not webhook_url:
+        return
+    try:
+        await validate_webhook_url(webhook_url)
+    except ValueError as e:
+        raise create_http_exception(400, str(e))
+
+def _check_specialty(specialty: Optional[str]) -> None:
+    """Reject specialties without a prompt template"""
+    if specialty and specialty not in prompt_templates.specialties:
+        raise create_http_exception(
+            400,
+            f"Unknown specialty '{specialty}'",
+            {"available": prompt_templates.specialties}
+        )
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/analyze", response_model=DiagnosisResponse, response_model_exclude_none=True)
 async def analyze_image(
+    request: Request,
+    file_service: FileServiceDep,
+    ai_service: AIServiceDep,
     file: UploadFile = File(..., description="Medical image to analyze"),
-    symptoms: Optional[str] = Form(None, description="Patient's described symptoms")
+    symptoms: Optional[str] = Form(None, description="Patient's described symptoms"),
+    specialty: Optional[str] = Form(None, description="Prompt template to use, e.g. dermatology or scalp"),
+    no_cache: bool = Form(False, description="Skip the result cache and force a fresh analysis")
 ):
     """Analyze uploaded medical image with optional symptoms"""
     
-    file_path = None
+    _check_specialty(specialty)
     try:
-        # Save uploaded file
-        file_path = file_service.save_uploaded_file(file)
+        # Per-client fairness before any work is done
+        await admission.admit_client(request)
+        
+        # Read and validate the upload in memory
+        image_data = await file_service.read_upload(file)
         
         # Analyze image with AI
-        diagnosis_text = ai_service.analyze_image_with_symptoms(file_path, symptoms)
+        diagnosis_text = await ai_service.analyze_image_with_symptoms(
+            image_data, symptoms, use_cache=not no_cache, specialty=specialty
+        )
+        
+        return await _build_diagnosis(diagnosis_text, symptoms)
+        
+    except FileProcessingError as e:
+        raise _invalid_upload(e)
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
+    except ModelError as e:
+        # The service has already logged the failure and prefixed its message
+        raise create_http_exception(500, e.message)
+    except Exception as e:
+        logger.error(f"Analysis failed: {str(e)}")
+        raise create_http_exception(500, f"Analysis failed: {str(e)}")
+
+@router.post(
+    "/analyze-batch",
+    response_model=BatchDiagnosisResponse,
+    response_model_exclude_none=True
+)
+async def analyze_image_batch(
+    request: Request,
+    file_service: FileServiceDep,
+    ai_service: AIServiceDep,
+    files: List[UploadFile] = File(..., description="Photos of the same condition"),
+    symptoms: Optional[str] = Form(None, description="Patient's described symptoms"),
+    specialty: Optional[str] = Form(None, description="Prompt template to use, e.g. dermatology or scalp"),
+    no_cache: bool = Form(False, description="Skip the result cache and force a fresh analysis"),
+    per_image: bool = Form(True, description="Also diagnose each image on its own")
+):
+    """Analyze several images of one condition in a single round trip"""
+    
+    _check_specialty(specialty)
+    if len(files) > settings.batch_max_images:
+        raise create_http_exception(
+            400,
+            f"Too many images: at most {settings.batch_max_images} per batch",
+            {"received": len(files)}
+        )
+    
+    try:
+        # Per-client fairness before any work is done
+        await admission.admit_client(request, cost=len(files))
+        
+        # Read and validate every upload concurrently; bad images are reported, not fatal
+        uploads = await asyncio.gather(
+            *(file_service.read_upload(file) for file in files),
+            return_exceptions=True
+        )
+        for upload in uploads:
+            if isinstance(upload, BaseException) and not isinstance(upload, FileProcessingError):
+                raise upload
+        
+        valid = [index for index, upload in enumerate(uploads) if not isinstance(upload, BaseException)]
+        if not valid:
+            raise uploads[0]
+        
+        analysis = await ai_service.analyze_image_batch(
+            [uploads[index] for index in valid],
+            symptoms,
+            use_cache=not no_cache,
+            per_image=per_image,
+            specialty=specialty
+        )
+        
+        results = [
+            BatchImageResult(index=index, filename=file.filename)
+            for index, file in enumerate(files)
+        ]
+        for index, upload in enumerate(uploads):
+            if isinstance(upload, FileProcessingError):
+                results[index].error = upload.message
+        rejected = 0
+        for index, outcome in zip(valid, analysis.per_image):
+            if isinstance(outcome, ImageQualityError):
+                results[index].error = outcome.message
+                rejected += 1
+            elif isinstance(outcome, Exception):
+                results[index].error = f"Analysis failed: {str(outcome)}"
+            elif outcome is not None:
+                results[index].diagnosis = await _build_diagnosis(outcome, symptoms)
+        
+        return BatchDiagnosisResponse(
+            aggregate=await _build_diagnosis(analysis.aggregate, symptoms),
+            results=results,
+            images_analyzed=len(valid) - rejected
+        )
+        
+    except FileProcessingError as e:
+        raise _invalid_upload(e)
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
+    except ModelError as e:
+        raise create_http_exception(500, e.message)
+    except Exception as e:
+        logger.error(f"Batch analysis failed: {str(e)}")
+        raise create_http_exception(500, f"Batch analysis failed: {str(e)}")
+
+@router.post("/analyze/stream")
+async def analyze_image_stream(
+    request: Request,
+    file_service: FileServiceDep,
+    ai_service: AIServiceDep,
+    file: UploadFile = File(..., description="Medical image to analyze"),
+    symptoms: Optional[str] = Form(None, description="Patient's described symptoms"),
+    specialty: Optional[str] = Form(None, description="Prompt template to use, e.g. dermatology or scalp"),
+    no_cache: bool = Form(False, description="Skip the result cache and force a fresh analysis")
+):
+    """Analyze uploaded medical image, streaming the diagnosis as Server-Sent Events"""
+    
+    _check_specialty(specialty)
+    try:
+        # Per-client fairness before any work is done
+        await admission.admit_client(request)
         
-        # Calculate confidence (simplified - in production, this would be from the model)
-        confidence = 85.0 if symptoms else 75.0
+        # Read and validate the upload in memory
+        image_data = await file_service.read_upload(file)
         
-        return DiagnosisResponse(
-            diagnosis=diagnosis_text,
-            confidence=confidence,
-            solution=diagnosis_text,  # For now, using same text
-            audio_available=True
+        # Wait for the first token so setup failures still get a proper status code
+        tokens = ai_service.stream_image_analysis(
+            image_data, symptoms, use_cache=not no_cache, specialty=specialty
         )
+        try:
+            first_token = await tokens.__anext__()
+        except StopAsyncIteration:
+            first_token = ""
         
+    except FileProcessingError as e:
+        raise _invalid_upload(e)
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
+    except ModelError as e:
+        raise create_http_exception(500, e.message)
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}")
         raise create_http_exception(500, f"Analysis failed: {str(e)}")
     
-    finally:
-        # Cleanup uploaded file
-        if file_path:
-            file_service.cleanup_file(file_path)
+    async def event_stream():
+        parts = [first_token]
+        yield _sse_event("token", {"text": first_token})
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield _sse_event("token", {"text": token})
+            result = await _build_diagnosis("".join(parts), symptoms)
+            yield _sse_event("result", jsonable_encoder(result, exclude_none=True))
+        except Exception as e:
+            logger.error(f"Streaming analysis failed: {str(e)}")
+            yield _sse_event("error", {"message": f"Analysis failed: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Keep GZip and reverse proxies from buffering the token stream
+            "Content-Encoding": "identity",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.get("/results/{result_id}")
+async def get_result(request: Request, result_id: str):
+    """Fetch a diagnosis by result ID; repeat fetches revalidate with If-None-Match"""
+    # An expired or unknown ID is a 404 whatever the client sent, including If-None-Match: *
+    payload = await result_cache.load_result(result_id)
+    if payload is None:
+        raise _result_not_found(result_id)
+    
+    etag = f'"{result_id}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    # Result IDs are content hashes, so a matching ETag can never be stale
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(payload, media_type="application/json", headers=headers)
 
 @router.post("/audio-response")
 async def get_audio_response(
-    text: str = Form(..., description="Text to convert to speech")
+    audio_service: AudioServiceDep,
+    text: Optional[str] = Form(None, description="Text to convert to speech"),
+    result_id: Optional[str] = Form(None, description="Speak a stored diagnosis instead of sending its text")
 ):
-    """Generate audio response from text"""
+    """Generate audio response from text or a stored result, streamed sentence by sentence"""
+    
+    if result_id:
+        payload = await result_cache.load_result(result_id)
+        if payload is None:
+            raise _result_not_found(result_id)
+        text = orjson.loads(payload)["diagnosis"]
+    if not text or not text.strip():
+        raise create_http_exception(400, "Provide text or a result_id")
     
-    audio_path = None
     try:
-        # Generate audio
-        audio_path = audio_service.text_to_speech(text)
-        
-        # Read audio file
-        audio_bytes = audio_service.get_audio_as_bytes(audio_path)
-        
-        return Response(
-            content=audio_bytes,
-            media_type="audio/mpeg",
-            headers={"Content-Disposition": "attachment; filename=response.mp3"}
-        )
+        # Wait for the first sentence so synthesis failures still get a proper status code
+        chunks = audio_service.stream_speech(text)
+        first_chunk = await chunks.__anext__()
         
     except Exception as e:
         logger.error(f"Audio generation failed: {str(e)}")
         raise create_http_exception(500, f"Audio generation failed: {str(e)}")
     
-    finally:
-        # Cleanup audio file
-        if audio_path and os.path.exists(audio_path):
-            os.remove(audio_path)
+    async def audio_stream():
+        yield first_chunk
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; end the stream after the audio we have
+            logger.error(f"Audio streaming failed: {str(e)}")
+    
+    backend = audio_service.backend
+    return StreamingResponse(
+        audio_stream(),
+        media_type=backend.media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=response.{backend.file_extension}",
+            # Skip GZip so audio chunks flush immediately
+            "Content-Encoding": "identity"
+        }
+    )
 
 @router.post("/transcribe")
 async def transcribe_audio(
+    request: Request,
+    file_service: FileServiceDep,
+    audio_ingest_service: AudioIngestServiceDep,
+    ai_service: AIServiceDep,
     file: UploadFile = File(..., description="Audio file to transcribe")
 ):
     """Transcribe uploaded audio file"""
     
-    file_path = None
     try:
-        # Save uploaded audio file
-        file_path = file_service.save_uploaded_file(file)
+        # Per-client fairness before any work is done
+        await admission.admit_client(request)
+        
+        # Read and validate the upload in memory
+        audio_data = await file_service.read_audio_upload(file)
+        
+        # Trim silence and downsample to 16 kHz mono before uploading to Whisper
+        prepared = await audio_ingest_service.prepare(audio_data, file.filename)
         
         # Transcribe audio
-        transcription = ai_service.transcribe_audio(file_path)
+        transcription = await ai_service.transcribe_audio(prepared.data, prepared.filename)
         
         return {"transcription": transcription}
         
+    except FileProcessingError as e:
+        raise _invalid_upload(e)
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
+    except ModelError as e:
+        raise create_http_exception(500, e.message)
     except Exception as e:
         logger.error(f"Transcription failed: {str(e)}")
         raise create_http_exception(500, f"Transcription failed: {str(e)}")
+
+@router.websocket("/transcribe/stream")
+async def transcribe_stream(websocket: WebSocket):
+    """Transcribe speech while it is being recorded
+    
+    The client sends 16-bit mono PCM at AUDIO_SAMPLE_RATE as binary messages and
+    {"type": "stop"} when done; "partial" messages arrive as each pause-delimited
+    segment is transcribed, followed by one "final" message.
+    """
+    await websocket.accept()
+    try:
+        # Per-client fairness before any work is done
+        await admission.admit_client(websocket)
+    except ServiceUnavailableError as e:
+        await websocket.send_json({"type": "error", "message": e.message, **e.details})
+        await websocket.close(code=1013)
+        return
     
+    session = stream_transcription_service.open_session(websocket.send_json)
+    try:
+        await session.send({"type": "ready", "sample_rate": session.sample_rate})
+        while session.accepting:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=settings.stream_idle_timeout)
+            except asyncio.TimeoutError:
+                break
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                session.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if isinstance(control, dict) and control.get("type") == "stop":
+                    break
+        
+        await session.finish()
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Streaming transcription failed: {str(e)}")
+        await session.send({"type": "error", "message": f"Transcription failed: {str(e)}"})
+        await websocket.close(code=1011)
     finally:
-        # Cleanup uploaded file
-        if file_path:
-            file_service.cleanup_file(file_path)
\ No newline at end of file
+        stream_transcription_service.close_session(session)
+
+@router.post("/jobs/analyze", response_model=JobStatus, status_code=202)
+async def submit_analysis_job(
+    request: Request,
+    file_service: FileServiceDep,
+    ai_service: AIServiceDep,
+    file: UploadFile = File(..., description="Medical image to analyze"),
+    symptoms: Optional[str] = Form(None, description="Patient's described symptoms"),
+    specialty: Optional[str] = Form(None, description="Prompt template to use, e.g. dermatology or scalp"),
+    no_cache: bool = Form(False, description="Skip the result cache and force a fresh analysis"),
+    priority: int = Form(5, ge=0, le=9, description="Lower values run first"),
+    webhook_url: Optional[str] = Form(None, description="URL to POST the finished job to")
+):
+    """Queue an image analysis and return a job ID to poll"""
+    
+    await _check_webhook_url(webhook_url)
+    _check_specialty(specialty)
+    try:
+        # Per-client fairness before any work is done
+        await admission.admit_client(request)
+        
+        # Validate now so bad uploads fail fast instead of inside the job
+        image_data = await file_service.read_upload(file)
+        
+        async def run() -> dict:
+            diagnosis_text = await ai_service.analyze_image_with_symptoms(
+                image_data, symptoms, use_cache=not no_cache, specialty=specialty
+            )
+            return jsonable_encoder(
+                await _build_diagnosis(diagnosis_text, symptoms), exclude_none=True
+            )
+        
+        job = await job_service.submit("analyze", run, priority, webhook_url)
+        return _job_status(job)
+        
+    except FileProcessingError as e:
+        raise _invalid_upload(e)
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
+    except Exception as e:
+        logger.error(f"Job submission failed: {str(e)}")
+        raise create_http_exception(500, f"Job submission failed: {str(e)}")
+
+@router.post("/jobs/transcribe", response_model=JobStatus, status_code=202)
+async def submit_transcription_job(
+    request: Request,
+    file_service: FileServiceDep,
+    audio_ingest_service: AudioIngestServiceDep,
+    ai_service: AIServiceDep,
+    file: UploadFile = File(..., description="Audio file to transcribe"),
+    priority: int = Form(5, ge=0, le=9, description="Lower values run first"),
+    webhook_url: Optional[str] = Form(None, description="URL to POST the finished job to")
+):
+    """Queue a transcription and return a job ID to poll"""
+    
+    await _check_webhook_url(webhook_url)
+    try:
+        # Per-client fairness before any work is done
+        await admission.admit_client(request)
+        
+        # Validate and preprocess now so bad uploads fail fast and retries reuse the result
+        audio_data = await file_service.read_audio_upload(file)
+        prepared = await audio_ingest_service.prepare(audio_data, file.filename)
+        
+        async def run() -> dict:
+            transcription = await ai_service.transcribe_audio(prepared.data, prepared.filename)
+            return {"transcription": transcription}
+        
+        job = await job_service.submit("transcribe", run, priority, webhook_url)
+        return _job_status(job)
+        
+    except FileProcessingError as e:
+        raise _invalid_upload(e)
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
+    except Exception as e:
+        logger.error(f"Job submission failed: {str(e)}")
+        raise create_http_exception(500, f"Job submission failed: {str(e)}")
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Poll the status and result of a background job"""
+    status = await job_service.status(job_id)
+    if status is None:
+        raise create_http_exception(404, "Job not found or expired", {"job_id": job_id})
+    return JobStatus(**status)
\ No newline at end of file
@@ -4,7 +4,16 @@ Health check endpoints
 from fastapi import APIRouter
 from app.models.schemas import HealthCheck
 from app.core.config import settings
-from app.services.ai_service import ai_service
+from app.core.concurrency import model_limiters
+from app.core.resilience import call_policies
+from app.api.dependencies import AudioServiceDep
+from app.services.cache_service import result_cache
+from app.services.image_index_service import get_image_index
+from app.services.image_service import get_image_service
+from app.services.janitor_service import janitor_service
+from app.services.job_service import job_service
+from app.services.model_router import stt_router, vision_router
+from app.services.prompt_templates import prompt_templates
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -15,13 +24,57 @@ async def health_check():
     # Check service availability
     services = {
         "groq_api": bool(settings.groq_api_key),
-        "ai_service": True,  # AI service is initialized
+        "ai_service": bool(settings.groq_api_key),  # built on first use; needs only the key
         "file_upload": True,
         "audio_processing": True
     }
     
+    # Models whose circuit breaker is open or probing report as degraded
+    for service, model in (("vision_model", settings.vision_model), ("stt_model", settings.stt_model)):
+        breaker = call_policies.get(model).breaker
+        services[service] = True if breaker.healthy else "degraded"
+    
     return HealthCheck(
-        status="healthy" if all(services.values()) else "degraded",
+        status="healthy" if all(value is True for value in services.values()) else "degraded",
         version=settings.app_version,
         services=services
-    )
\ No newline at end of file
+    )
+
+@router.get("/cache")
+async def cache_stats(audio_service: AudioServiceDep):
+    """Diagnosis result, near-duplicate index and TTS cache statistics"""
+    # The index is not built until the first image has been analyzed
+    image_index = get_image_index.peek()
+    return {
+        "results": result_cache.stats(),
+        "near_duplicates": image_index.stats() if image_index is not None else None,
+        "tts": audio_service.stats()
+    }
+
+@router.get("/images")
+async def image_stats():
+    """Image preprocessing savings and quality check rejections by reason"""
+    return get_image_service().stats()
+
+@router.get("/jobs")
+async def job_stats():
+    """Background job queue depth and job counts"""
+    return job_service.stats()
+
+@router.get("/disk")
+async def disk_stats():
+    """Janitor sweeps and space reclaimed from upload and temp directories"""
+    return janitor_service.stats()
+
+@router.get("/models")
+async def model_stats():
+    """Routing, circuit breaker, hedging and concurrency state per model"""
+    return {
+        "routes": {
+            "vision": vision_router.stats(),
+            "stt": stt_router.stats()
+        },
+        "policies": call_policies.stats(),
+        "limiters": model_limiters.stats(),
+        "prompt_templates": prompt_templates.stats()
+    }
\ No newline at end of file
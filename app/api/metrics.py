@@ -0,0 +1,72 @@
+"""
+Metrics endpoints
+"""
+import os
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import STAGE_DURATION, metrics
+from app.core.middleware import HTTP_DURATION
+from app.services.audio_service import get_audio_service
+from app.services.cache_service import result_cache
+from app.services.image_index_service import get_image_index
+
+router = APIRouter(tags=["metrics"])
+
+CACHE_ENTRIES = metrics.gauge(
+    "ai_doctor_cache_entries",
+    "Entries currently held in each cache tier",
+    ("cache",)
+)
+CACHE_BYTES = metrics.gauge(
+    "ai_doctor_cache_bytes",
+    "Bytes currently held in each cache tier",
+    ("cache",)
+)
+
+def _collect_cache_sizes() -> None:
+    """Refresh cache size gauges from the services"""
+    tiers = {"result_memory": result_cache.memory.stats()}
+    # Not built until the first speech request
+    audio_service = get_audio_service.peek()
+    if audio_service is not None:
+        tiers["tts_memory"] = audio_service.cache.stats()
+    if result_cache.disk is not None:
+        tiers["result_disk"] = result_cache.disk.stats()
+    if result_cache.result_store is not None:
+        tiers["result_store"] = result_cache.result_store.stats()
+    image_index = get_image_index.peek()
+    if image_index is not None:
+        tiers["near_duplicate_index"] = image_index.stats()
+    for name, stats in tiers.items():
+        CACHE_ENTRIES.set(stats["entries"], cache=name)
+        CACHE_BYTES.set(stats["bytes"], cache=name)
+
+metrics.add_collector(_collect_cache_sizes)
+
+def _summarize(histogram) -> list:
+    """p50/p99 estimates for every label set of a histogram"""
+    summary = []
+    for labels in histogram.label_sets():
+        summary.append({
+            **labels,
+            "p50_ms": round(histogram.quantile(0.5, **labels) * 1000, 1),
+            "p99_ms": round(histogram.quantile(0.99, **labels) * 1000, 1)
+        })
+    return summary
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@router.get("/metrics/summary")
+async def metrics_summary():
+    """Per-stage and per-route latency percentiles of the worker process that answered"""
+    return {
+        "pid": os.getpid(),
+        "stages": _summarize(STAGE_DURATION),
+        "http": _summarize(HTTP_DURATION)
+    }
@@ -0,0 +1,112 @@
+"""
+Concurrency limits for outbound model calls
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+from app.core.config import settings
+from app.core.exceptions import ServiceUnavailableError
+from app.core.metrics import metrics, track_stage
+
+logger = logging.getLogger(__name__)
+
+MODEL_REJECTIONS = metrics.counter(
+    "ai_doctor_model_rejections_total",
+    "Model calls rejected because the model was saturated",
+    ("model", "reason")
+)
+
+class ModelLimiter:
+    """Bounded in-flight limiter with a queue-wait timeout for a single model"""
+
+    def __init__(
+        self,
+        model: str,
+        max_in_flight: int,
+        max_waiting: int,
+        queue_timeout: float
+    ):
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one model slot for the duration of the block"""
+        # Fail fast when the wait queue is already full
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            MODEL_REJECTIONS.inc(model=self.model, reason="queue_full")
+            raise self._saturated("queue is full")
+
+        self.waiting += 1
+        try:
+            with track_stage("queue_wait", self.model):
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            MODEL_REJECTIONS.inc(model=self.model, reason="queue_timeout")
+            raise self._saturated(f"no slot freed within {self.queue_timeout:.1f}s")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _saturated(self, reason: str) -> ServiceUnavailableError:
+        """Build the error raised when the model is saturated"""
+        logger.warning(f"Rejecting {self.model} request: {reason}")
+        return ServiceUnavailableError(
+            "The AI service is busy, please retry shortly",
+            {
+                "model": self.model,
+                "reason": reason,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting
+            }
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Current limiter counters"""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected
+        }
+
+class LimiterRegistry:
+    """One limiter per model name, created on first use"""
+
+    def __init__(self):
+        self._limiters: Dict[str, ModelLimiter] = {}
+
+    def get(self, model: str, max_in_flight: int) -> ModelLimiter:
+        """Return the limiter for a model, creating it if needed"""
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limiter = ModelLimiter(
+                model,
+                max_in_flight=max_in_flight,
+                max_waiting=settings.max_queued_requests,
+                queue_timeout=settings.queue_timeout
+            )
+            self._limiters[model] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Counters for every known model"""
+        return {model: limiter.stats() for model, limiter in self._limiters.items()}
+
+# Global limiter registry
+model_limiters = LimiterRegistry()
@@ -2,6 +2,7 @@
 Application configuration settings
 """
 import os
+import tempfile
 from typing import Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -23,18 +24,160 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     
+    # Production Server Configuration (serve.py)
+    workers: int = 0  # 0 starts one worker per available CPU core
+    server_backlog: int = 2048  # connections the listen socket queues before refusing
+    keepalive_timeout: int = 75  # idle keep-alive seconds; keep above the load balancer's
+    max_requests: int = 10000  # recycle a worker after this many requests to contain memory growth
+    max_requests_jitter: int = 1000  # stagger recycling so workers restart at different times
+    graceful_timeout: float = 30.0  # seconds to drain requests, then again for background jobs, on SIGTERM
+    
     # File Upload Configuration
     max_file_size: int = 5 * 1024 * 1024  # 5MB
     allowed_extensions: list = [".jpg", ".jpeg", ".png", ".webp"]
     upload_dir: str = "uploads"
+    upload_chunk_size: int = 64 * 1024  # bytes read per chunk while validating size
+    retain_uploads: bool = False  # spool uploads to upload_dir for audit retention
+    
+    # Disk Janitor Configuration
+    janitor_enabled: bool = True
+    janitor_interval: float = 600.0  # seconds between sweeps
+    upload_max_age: int = 24 * 3600  # seconds a retained upload is kept
+    upload_max_bytes: int = 1024 * 1024 * 1024  # oldest uploads go first beyond 1GB
+    
+    # Image Preprocessing Configuration
+    image_max_edge: int = 1568  # longest side in pixels sent to the vision model
+    image_jpeg_quality: int = 85
+    image_webp_quality: int = 80
+    image_preprocess_workers: int = 2  # process pool size; 0 runs in a thread instead
+    image_quality_check: bool = True  # reject unusable images before the vision model call
+    image_min_edge: int = 224  # shortest side in pixels
+    image_min_sharpness: float = 6.0  # Laplacian variance at 512 px; 0 disables the blur check
+    image_max_clipped: float = 0.6  # share of pixels crushed to black or blown to white
+    image_min_skin_ratio: float = 0.05  # share of skin-toned pixels; 0 disables the check
     
     # Audio Configuration
-    max_recording_duration: int = 30  # seconds
+    max_recording_duration: int = 30  # seconds of speech after silence trimming
+    allowed_audio_extensions: list = [
+        ".wav", ".mp3", ".mpga", ".mpeg", ".m4a", ".mp4", ".webm", ".ogg", ".oga", ".opus", ".flac"
+    ]
+    max_audio_file_size: int = 25 * 1024 * 1024  # 25MB, the Whisper upload limit
+    audio_sample_rate: int = 16000  # Whisper resamples to 16 kHz anyway
+    audio_ingest_format: str = "flac"  # lossless and compact; falls back to wav without ffmpeg
+    audio_silence_threshold: float = -45.0  # dBFS below which leading/trailing audio is trimmed
+    audio_silence_padding_ms: int = 200  # audio kept around detected speech
+    audio_preprocess_workers: int = 2  # process pool size; 0 runs in a thread instead
     audio_format: str = "mp3"
+    tts_backend: str = "gtts"  # "gtts" (network) or "espeak" (local, offline)
+    tts_language: str = "en"
+    tts_tld: str = "com"  # Use .com domain for better quality
+    tts_cache_max_entries: int = 256
+    tts_cache_max_bytes: int = 32 * 1024 * 1024  # byte budget for cached MP3s
+    tts_workers: int = 4  # sentences synthesized in parallel
+    tts_min_chunk_chars: int = 40  # shorter sentences are merged with the next one
+    espeak_binary: Optional[str] = None  # defaults to espeak-ng, then espeak, on PATH
+    espeak_voice: str = "en-us"
+    espeak_rate: int = 165  # words per minute
+    
+    # Streaming Transcription (WebSocket, 16-bit mono PCM at audio_sample_rate)
+    stream_vad_threshold: float = -40.0  # dBFS a 30 ms frame must exceed to count as speech
+    stream_silence_ms: int = 600  # pause that ends a segment
+    stream_min_speech_ms: int = 250  # shorter bursts are treated as noise
+    stream_max_segment_seconds: float = 15.0  # segments are cut here even without a pause
+    stream_max_concurrent_segments: int = 3  # segment transcriptions in flight per connection
+    stream_idle_timeout: float = 30.0  # seconds without a message before the stream is finalized
     
     # Model Configuration
     vision_model: str = "meta-llama/llama-4-scout-17b-16e-instruct"
     stt_model: str = "whisper-large-v3"
+    default_specialty: str = "general"  # prompt template used when a request names none
+    prompt_template_versions: dict = {}  # pin a specialty to a version, e.g. {"dermatology": 1}
+    
+    # Model Routing Configuration
+    vision_fallback_models: list = ["meta-llama/llama-4-maverick-17b-128e-instruct"]
+    stt_fallback_models: list = ["whisper-large-v3-turbo"]
+    vision_latency_budget: float = 10.0  # seconds; slower models are skipped while others fit
+    stt_latency_budget: float = 6.0
+    model_latency_budgets: dict = {}  # per-model overrides of the budgets above
+    model_costs: dict = {}  # relative cost per model (default 1.0), weighs the fallback order
+    router_ewma_alpha: float = 0.2  # weight of the newest latency/error sample
+    router_max_error_rate: float = 0.5  # models failing more often than this are deprioritized
+    router_fallback_factor: float = 2.0  # multiple of the budget a model gets before falling back
+    
+    # Groq HTTP Client Configuration
+    groq_max_connections: int = 100
+    groq_max_keepalive_connections: int = 20
+    groq_keepalive_expiry: float = 120.0  # seconds an idle pooled connection stays open
+    groq_keepalive_interval: float = 60.0  # idle ping to keep connections warm; 0 disables
+    groq_connect_timeout: float = 5.0
+    groq_read_timeout: float = 60.0
+    groq_pool_timeout: float = 10.0  # seconds to wait for a free pooled connection
+    groq_http2: bool = False  # requires the h2 package
+    groq_max_retries: int = 0  # retries are handled by the call policy below
+    groq_warmup_connections: int = 2  # connections opened at startup; 0 disables
+    
+    # Concurrency Configuration
+    max_concurrent_vision_requests: int = 8  # in-flight vision calls per worker
+    max_concurrent_stt_requests: int = 8  # in-flight transcriptions per worker
+    max_queued_requests: int = 32  # callers allowed to wait for a slot per model
+    queue_timeout: float = 10.0  # seconds to wait for a free slot before 503
+    
+    # Rate Limiting Configuration
+    rate_limit_enabled: bool = True
+    rate_limit_store_path: Optional[str] = os.path.join(
+        tempfile.gettempdir(), "ai_doctor_rate_limits.sqlite3"
+    )  # SQLite file shared by workers; empty keeps buckets per process
+    client_rpm: int = 20  # sustained model-backed requests per API key or IP
+    client_burst: int = 10
+    trust_forwarded_for: bool = False  # use X-Forwarded-For behind a trusted proxy
+    upstream_rpm: int = 30  # Groq requests per minute per model
+    upstream_tpm: int = 30000  # Groq tokens per minute per model
+    upstream_rate_limits: dict = {}  # per-model overrides, e.g. {"whisper-large-v3": {"rpm": 20}}
+    vision_tokens_per_image: int = 1500  # rough prompt tokens charged per image
+    
+    # Resilience Configuration
+    model_call_deadline: float = 45.0  # seconds per model call, retries included
+    model_retry_attempts: int = 3
+    model_retry_backoff: float = 0.5  # base seconds, doubled per attempt with full jitter
+    model_retry_backoff_max: float = 8.0
+    hedge_enabled: bool = True  # race a second request when a call runs past the usual p95
+    hedge_quantile: float = 0.95
+    hedge_min_delay: float = 2.0  # never hedge sooner than this many seconds
+    hedge_min_samples: int = 20  # latencies needed before hedging starts
+    circuit_failure_threshold: int = 5  # consecutive provider failures that open the circuit
+    circuit_reset_timeout: float = 30.0  # seconds before a trial call is let through
+    
+    # Batch Analysis Configuration
+    batch_max_images: int = 5  # Llama 4 Scout accepts up to 5 images per request
+    batch_max_concurrency: int = 4  # per-image vision calls in flight for one batch
+    
+    # Job Queue Configuration
+    job_workers: int = 4  # background workers draining the job queue per process
+    job_max_pending: int = 256  # queued jobs before new submissions get 503
+    job_max_attempts: int = 3
+    job_retry_backoff: float = 2.0  # seconds before the first retry, doubled after each
+    job_result_ttl: int = 3600  # seconds a finished job stays pollable
+    job_webhook_timeout: float = 10.0
+    job_store_path: Optional[str] = os.path.join(
+        tempfile.gettempdir(), "ai_doctor_jobs.sqlite3"
+    )  # SQLite file sharing job states between workers; empty keeps them per process
+    job_store_max_bytes: int = 16 * 1024 * 1024
+    webhook_allowed_hosts: list = []  # webhook hosts (and subdomains) allowed; empty allows public addresses only
+    
+    # Result Cache Configuration
+    result_cache_enabled: bool = True
+    result_cache_max_entries: int = 512  # in-process LRU tier
+    result_cache_ttl: int = 24 * 3600  # seconds
+    result_cache_path: Optional[str] = None  # SQLite file enables the on-disk tier
+    result_cache_max_bytes: int = 64 * 1024 * 1024  # on-disk tier budget
+    result_store_path: Optional[str] = os.path.join(
+        tempfile.gettempdir(), "ai_doctor_results.sqlite3"
+    )  # SQLite file sharing result IDs between workers; empty keeps them per process
+    result_store_max_bytes: int = 32 * 1024 * 1024
+    near_duplicate_enabled: bool = True  # reuse diagnoses of re-photographed or re-compressed images
+    near_duplicate_threshold: int = 6  # most differing bits of the 64-bit perceptual hash
+    near_duplicate_capacity: int = 10000  # hashes kept; the oldest is overwritten first
+    near_duplicate_ttl: int = 24 * 3600  # seconds; older entries are not matched (0 keeps them)
     
     class Config:
         env_file = ".env"
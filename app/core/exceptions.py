@@ -19,6 +19,14 @@ class FileProcessingError(AIDocterException):
     """Raised when file processing fails"""
     pass
 
+class FileTooLargeError(FileProcessingError):
+    """Raised when an upload exceeds the configured size limit"""
+    pass
+
+class ImageQualityError(FileProcessingError):
+    """Raised when an image is too small, dark, bright, blurry or shows no skin"""
+    pass
+
 class ModelError(AIDocterException):
     """Raised when AI model processing fails"""
     pass
@@ -27,10 +35,31 @@ class AudioProcessingError(AIDocterException):
     """Raised when audio processing fails"""
     pass
 
+class ServiceUnavailableError(AIDocterException):
+    """Raised when a model is saturated and the request should be retried later"""
+    pass
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised when a model's circuit breaker is open and calls fail fast"""
+    pass
+
+class RateLimitExceededError(ServiceUnavailableError):
+    """Raised when admission control has no budget left for a request"""
+    pass
+
+class DeadlineExceededError(ServiceUnavailableError):
+    """Raised when a model call does not finish within its deadline"""
+    pass
+
+class ModelUnavailableError(ServiceUnavailableError):
+    """Raised when a model call still fails transiently after all retries and fallback models"""
+    pass
+
 def create_http_exception(
     status_code: int,
     message: str,
-    details: Optional[Dict[str, Any]] = None
+    details: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None
 ) -> HTTPException:
     """Create a standardized HTTP exception"""
     return HTTPException(
@@ -39,5 +68,6 @@ def create_http_exception(
             "message": message,
             "details": details or {},
             "status_code": status_code
-        }
+        },
+        headers=headers
     )
\ No newline at end of file
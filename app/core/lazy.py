@@ -0,0 +1,36 @@
+"""
+Shared service instances built on first use instead of at import time
+"""
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+class LazyService(Generic[T]):
+    """Builds one shared instance on first call and returns it afterwards"""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> T:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    async def dependency(self) -> T:
+        """FastAPI dependency form; async so it is not dispatched to the threadpool"""
+        return self()
+
+    @property
+    def built(self) -> bool:
+        return self._instance is not None
+
+    def peek(self) -> Optional[T]:
+        """The instance if it has been built, without building it"""
+        return self._instance
@@ -0,0 +1,53 @@
+"""
+ASGI middleware for request-level instrumentation
+"""
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import metrics
+
+HTTP_DURATION = metrics.histogram(
+    "ai_doctor_http_request_duration_seconds",
+    "HTTP request latency from first byte received to last byte sent",
+    ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = metrics.gauge(
+    "ai_doctor_http_requests_in_flight",
+    "HTTP requests currently being served",
+    ("method",)
+)
+
+class MetricsMiddleware:
+    """Record latency, status and concurrency for every HTTP request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(method=method)
+            # Use the route template so path parameters do not explode cardinality
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_DURATION.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=route_path,
+                status=str(status_code)
+            )
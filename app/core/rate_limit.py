@@ -0,0 +1,207 @@
+"""
+Token-bucket admission control per client and per upstream model budget
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+from starlette.requests import HTTPConnection
+from app.core.config import settings
+from app.core.exceptions import RateLimitExceededError
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Buckets idle this long are full again and can be forgotten
+IDLE_BUCKET_SECONDS = 3600
+
+RATE_LIMITED = metrics.counter(
+    "ai_doctor_rate_limited_total",
+    "Requests rejected by admission control",
+    ("scope",)
+)
+
+# (key, capacity, refill tokens per second, cost)
+BucketRequest = Tuple[str, float, float, float]
+
+class MemoryBucketStore:
+    """Token buckets held in this process"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, requests: Sequence[BucketRequest]) -> float:
+        """Take from every bucket or none; returns 0 or the seconds until all would fit"""
+        now = time.time()
+        with self._lock:
+            levels = {}
+            wait = 0.0
+            for key, capacity, rate, cost in requests:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                levels[key] = tokens
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate if rate > 0 else float("inf"))
+            if wait == 0.0:
+                for key, _, _, cost in requests:
+                    levels[key] -= cost
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens, now)
+            if len(self._buckets) > 10000:
+                self._prune(now)
+            return wait
+
+    def _prune(self, now: float) -> None:
+        idle = [key for key, (_, updated) in self._buckets.items() if now - updated > IDLE_BUCKET_SECONDS]
+        for key in idle:
+            del self._buckets[key]
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, shared by every worker on the host"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        # Short-lived connection, so a forked worker never inherits an open handle
+        conn = sqlite3.connect(path, timeout=5.0)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, requests: Sequence[BucketRequest]) -> float:
+        """Take from every bucket or none; returns 0 or the seconds until all would fit"""
+        conn = self._connect()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front so workers cannot interleave
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = {}
+            wait = 0.0
+            for key, capacity, rate, cost in requests:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+                levels[key] = tokens
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate if rate > 0 else float("inf"))
+            if wait == 0.0:
+                for key, _, _, cost in requests:
+                    levels[key] -= cost
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                [(key, tokens, now) for key, tokens in levels.items()]
+            )
+            self._takes += 1
+            if self._takes % 1000 == 0:
+                conn.execute(
+                    "DELETE FROM buckets WHERE updated < ?", (now - IDLE_BUCKET_SECONDS,)
+                )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+class AdmissionController:
+    """Per-client fairness at the edge and upstream RPM/TPM budgets per model"""
+
+    def __init__(self):
+        self.enabled = settings.rate_limit_enabled
+        self.store = self._create_store()
+
+    def _create_store(self):
+        path = settings.rate_limit_store_path
+        if path:
+            try:
+                return SQLiteBucketStore(path)
+            except Exception as e:
+                logger.warning(f"Shared rate limit store unavailable, limiting per process: {str(e)}")
+        return MemoryBucketStore()
+
+    def client_ids(self, request: HTTPConnection) -> List[str]:
+        """The client address, plus the API key if one was sent"""
+        host = request.client.host if request.client else "unknown"
+        if settings.trust_forwarded_for:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                host = forwarded.split(",")[0].strip()
+        client_ids = [f"ip:{host}"]
+        
+        api_key = request.headers.get("x-api-key")
+        authorization = request.headers.get("authorization", "")
+        if not api_key and authorization.lower().startswith("bearer "):
+            api_key = authorization[7:].strip()
+        # Keys are not verified, so they only add a bucket; a random key never resets the IP's
+        if api_key:
+            client_ids.append(f"key:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}")
+        return client_ids
+
+    async def admit_client(self, request: HTTPConnection, cost: int = 1) -> None:
+        """Charge the client's buckets or raise RateLimitExceededError"""
+        if not self.enabled:
+            return
+        client_ids = self.client_ids(request)
+        cost = min(cost, settings.client_burst)
+        await self._take(
+            "client",
+            [
+                (f"client:{client_id}", settings.client_burst, settings.client_rpm / 60, cost)
+                for client_id in client_ids
+            ],
+            {"client": "+".join(client_id.split(":", 1)[0] for client_id in client_ids)}
+        )
+
+    async def admit_upstream(self, model: str, tokens: int = 0) -> None:
+        """Charge a model's request and token budgets before calling it"""
+        if not self.enabled:
+            return
+        budget = settings.upstream_rate_limits.get(model, {})
+        rpm = budget.get("rpm", settings.upstream_rpm)
+        tpm = budget.get("tpm", settings.upstream_tpm)
+        requests: List[BucketRequest] = [(f"rpm:{model}", rpm, rpm / 60, 1)]
+        if tpm and tokens:
+            requests.append((f"tpm:{model}", tpm, tpm / 60, min(tokens, tpm)))
+        await self._take("upstream", requests, {"model": model})
+
+    async def _take(self, scope: str, requests: List[BucketRequest], details: Dict[str, str]) -> None:
+        try:
+            wait = await asyncio.to_thread(self.store.take, requests)
+        except Exception as e:
+            # A locked or unwritable store must not turn into failed requests
+            logger.warning(f"Admission check skipped ({scope}): {str(e)}")
+            return
+        if wait > 0:
+            RATE_LIMITED.inc(scope=scope)
+            retry_after = max(1, int(min(wait, 3600) + 0.999))
+            raise RateLimitExceededError(
+                "Too many requests, please retry shortly",
+                {**details, "scope": scope, "retry_after": retry_after}
+            )
+
+# Global admission controller
+admission = AdmissionController()
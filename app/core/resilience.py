@@ -0,0 +1,273 @@
+"""
+Call policies for model requests: deadlines, jittered retries, hedging and circuit breaking
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from app.core.config import settings
+from app.core.exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
+    ServiceUnavailableError
+)
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MODEL_RETRIES = metrics.counter(
+    "ai_doctor_model_retries_total",
+    "Model calls retried after a transient error",
+    ("model", "reason")
+)
+MODEL_HEDGES = metrics.counter(
+    "ai_doctor_model_hedges_total",
+    "Hedged second requests and which request won",
+    ("model", "winner")
+)
+CIRCUIT_STATE = metrics.gauge(
+    "ai_doctor_circuit_state",
+    "Circuit breaker state per model (0 closed, 1 half-open, 2 open)",
+    ("model",)
+)
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429}
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed model call may succeed if repeated"""
+    import groq
+    
+    if isinstance(error, groq.APIConnectionError):
+        # Includes APITimeoutError
+        return True
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Server-requested delay from a Retry-After header, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial call through"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        CIRCUIT_STATE.set(0, model=name)
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now"""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise self._open_error(remaining)
+            self._transition(self.HALF_OPEN)
+        if self._trial_in_flight:
+            raise self._open_error(self.reset_timeout)
+        self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial_in_flight = False
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+            self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """End a call that neither succeeded nor failed against the provider"""
+        self._trial_in_flight = False
+
+    @property
+    def healthy(self) -> bool:
+        return self.state == self.CLOSED
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"Circuit for {self.name} {self.state} -> {state}")
+        self.state = state
+        CIRCUIT_STATE.set({self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[state], model=self.name)
+
+    def _open_error(self, retry_after: float) -> CircuitOpenError:
+        return CircuitOpenError(
+            "The AI service is temporarily unavailable, please retry shortly",
+            {"model": self.name, "retry_after": max(1, int(retry_after + 0.999))}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened
+        }
+
+class CallPolicy:
+    """Deadline, retry, hedging and circuit breaking around calls to one model"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.breaker = CircuitBreaker(
+            model,
+            failure_threshold=settings.circuit_failure_threshold,
+            reset_timeout=settings.circuit_reset_timeout
+        )
+        self._latencies: Deque[float] = deque(maxlen=256)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay before sending a hedged request, from recent latency, or None"""
+        if not settings.hedge_enabled or len(self._latencies) < settings.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(settings.hedge_quantile * len(ordered)))
+        return max(settings.hedge_min_delay, ordered[index])
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        hedge: bool = True,
+        deadline: Optional[float] = None
+    ) -> T:
+        """Run a model call under this policy"""
+        loop = asyncio.get_running_loop()
+        budget = deadline if deadline is not None else settings.model_call_deadline
+        expires = loop.time() + budget
+        attempt = 0
+
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            remaining = expires - loop.time()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                started = time.perf_counter()
+                result = await asyncio.wait_for(self._attempt(operation, hedge), timeout=remaining)
+            except asyncio.TimeoutError:
+                self.breaker.record_failure()
+                raise DeadlineExceededError(
+                    "The AI service took too long to respond, please retry",
+                    {"model": self.model, "deadline": budget, "attempts": attempt}
+                )
+            except ServiceUnavailableError:
+                # Local saturation says nothing about the provider
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                delay = self._backoff(attempt, e)
+                if attempt >= settings.model_retry_attempts or delay >= expires - loop.time():
+                    raise
+                reason = type(e).__name__
+                MODEL_RETRIES.inc(model=self.model, reason=reason)
+                logger.warning(
+                    f"{self.model} call failed ({reason}), retry {attempt} in {delay:.2f}s: {str(e)}"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._latencies.append(time.perf_counter() - started)
+            return result
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After on rate limits"""
+        ceiling = min(settings.model_retry_backoff_max, settings.model_retry_backoff * 2 ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        requested = _retry_after(error)
+        if requested is not None:
+            delay = max(delay, min(requested, settings.model_retry_backoff_max))
+        return delay
+
+    async def _attempt(self, operation: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        """One attempt, racing a second request if the first is slower than usual"""
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return await operation()
+
+        primary = asyncio.ensure_future(operation())
+        hedged: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            hedged = asyncio.ensure_future(operation())
+            pending = {primary, hedged}
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        MODEL_HEDGES.inc(
+                            model=self.model,
+                            winner="hedge" if task is hedged else "primary"
+                        )
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            # Also reached when the deadline cancels this attempt, so no request outlives it
+            for task in (primary, hedged):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            **self.breaker.stats(),
+            "hedge_delay": round(delay, 3) if delay is not None else None
+        }
+
+class PolicyRegistry:
+    """One call policy per model name, created on first use"""
+
+    def __init__(self):
+        self._policies: Dict[str, CallPolicy] = {}
+
+    def get(self, model: str) -> CallPolicy:
+        policy = self._policies.get(model)
+        if policy is None:
+            policy = CallPolicy(model)
+            self._policies[model] = policy
+        return policy
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {model: policy.stats() for model, policy in self._policies.items()}
+
+# Global call policy registry
+call_policies = PolicyRegistry()
@@ -14,9 +14,40 @@ class DiagnosisResponse(BaseModel):
     """Response model for diagnosis results"""
     diagnosis: str = Field(..., description="AI diagnosis result")
     confidence: float = Field(..., ge=0, le=100, description="Confidence percentage")
-    solution: str = Field(..., description="Recommended treatment/solution")
+    solution: Optional[str] = Field(
+        None, description="Recommended treatment/solution; omitted when it repeats the diagnosis"
+    )
     timestamp: datetime = Field(default_factory=datetime.now)
     audio_available: bool = Field(False, description="Whether audio response is available")
+    result_id: Optional[str] = Field(
+        None, description="Stable ID to fetch this result again or request its audio"
+    )
+
+class BatchImageResult(BaseModel):
+    """Outcome for one image in a batch diagnosis"""
+    index: int = Field(..., description="Position of the image in the upload")
+    filename: Optional[str] = Field(None, description="Uploaded file name")
+    diagnosis: Optional[DiagnosisResponse] = Field(None, description="Diagnosis for this image alone")
+    error: Optional[str] = Field(None, description="Why this image could not be analyzed")
+
+class BatchDiagnosisResponse(BaseModel):
+    """Response model for a multi-image diagnosis"""
+    aggregate: DiagnosisResponse = Field(..., description="Diagnosis from all valid images together")
+    results: List[BatchImageResult] = Field(..., description="Per-image results in upload order")
+    images_analyzed: int = Field(..., description="Number of images included in the aggregate")
+
+class JobStatus(BaseModel):
+    """Response model for a background job"""
+    job_id: str = Field(..., description="Job identifier to poll")
+    kind: str = Field(..., description="Job type: analyze or transcribe")
+    status: str = Field(..., description="queued, running, retrying, completed or failed")
+    priority: int = Field(..., description="Lower values run first")
+    attempts: int = Field(0, description="Attempts made so far")
+    result: Optional[dict] = Field(None, description="Endpoint response once completed")
+    error: Optional[str] = Field(None, description="Last failure message")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 class AudioResponse(BaseModel):
     """Response model for audio data"""
@@ -1,106 +1,542 @@
 """
 AI processing services for image analysis and text generation
 """
-import base64
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Tuple
-from groq import Groq
+import os
+import time
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Union
 from app.core.config import settings
-from app.core.exceptions import APIKeyError, ModelError
+from app.core.concurrency import model_limiters
+from app.core.lazy import LazyService
+from app.core.metrics import STAGE_DURATION, track_stage
+from app.core.rate_limit import admission
+from app.core.exceptions import (
+    APIKeyError,
+    FileProcessingError,
+    ImageQualityError,
+    ModelError,
+    ServiceUnavailableError
+)
+from app.services.cache_service import result_cache
+from app.services.image_index_service import get_image_index
+from app.services.image_service import PreparedImage, get_image_service
+from app.services.model_router import stt_router, vision_router
+from app.services.prompt_templates import PromptTemplate, prompt_templates
+
+if TYPE_CHECKING:
+    from groq import AsyncGroq
 
 logger = logging.getLogger(__name__)
 
+class BatchAnalysis(NamedTuple):
+    """Aggregate diagnosis for a set of images plus the per-image outcomes"""
+    aggregate: str
+    per_image: List[Union[str, Exception, None]]
+
 class AIService:
     """Service for AI-powered medical analysis"""
     
     def __init__(self):
         if not settings.groq_api_key:
             raise APIKeyError("GROQ API key is required")
-        self.client = Groq(api_key=settings.groq_api_key)
-        self.system_prompt = self._get_system_prompt()
+        self._client: Optional["AsyncGroq"] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_used = 0.0
+        # A forked worker must not reuse sockets inherited from the parent
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_client)
+    
+    @property
+    def client(self) -> "AsyncGroq":
+        """Groq client bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # httpx pools belong to the loop that opened them, so each loop gets its own
+            self._client = self._create_client()
+            self._client_loop = loop
+        self._last_used = time.monotonic()
+        return self._client
+    
+    def _create_client(self) -> "AsyncGroq":
+        """Build a Groq client on a tuned, pooled HTTP transport"""
+        # Imported here so workers boot without loading the Groq SDK
+        import httpx
+        from groq import AsyncGroq
+        
+        http2 = settings.groq_http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("GROQ_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+                http2 = False
+        
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.groq_max_connections,
+                max_keepalive_connections=settings.groq_max_keepalive_connections,
+                keepalive_expiry=settings.groq_keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                settings.groq_read_timeout,
+                connect=settings.groq_connect_timeout,
+                pool=settings.groq_pool_timeout
+            ),
+            follow_redirects=True
+        )
+        return AsyncGroq(
+            api_key=settings.groq_api_key,
+            http_client=http_client,
+            max_retries=settings.groq_max_retries
+        )
+    
+    def _reset_client(self) -> None:
+        """Forget the current client without closing sockets another process owns"""
+        self._client = None
+        self._client_loop = None
+    
+    async def warmup(self) -> None:
+        """Open pooled connections (DNS, TCP and TLS) before the first patient request"""
+        connections = settings.groq_warmup_connections
+        if connections <= 0:
+            return
+        started = time.perf_counter()
+        with track_stage("client_warmup"):
+            results = await asyncio.gather(
+                *(self.client.models.list() for _ in range(connections)),
+                return_exceptions=True
+            )
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            logger.warning(f"Groq warmup: {len(failures)}/{connections} requests failed: {str(failures[0])}")
+        else:
+            logger.info(
+                f"Groq warmup: {connections} connections ready in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms"
+            )
     
-    def _get_system_prompt(self) -> str:
-        """Get the system prompt for medical analysis"""
-        return """You are a professional medical AI assistant. Analyze the provided image and symptoms to provide helpful medical insights.
-
-Guidelines:
-- Provide clear, professional medical observations
-- Suggest appropriate remedies or next steps
-- Always recommend consulting a healthcare professional for serious concerns
-- Keep responses concise but informative (2-3 sentences)
-- Use empathetic, patient-friendly language
-- Start responses with "Based on what I observe..." rather than "In the image I see"
-- Avoid markdown formatting in responses
-
-Remember: This is for educational purposes and should not replace professional medical advice."""
-
-    def encode_image(self, image_path: str) -> str:
-        """Encode image to base64 format"""
+    async def keep_warm(self) -> None:
+        """Ping the API while idle so keep-alive connections are not dropped"""
+        interval = settings.groq_keepalive_interval
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self._last_used < interval:
+                continue
+            try:
+                await self.client.models.list()
+            except Exception as e:
+                logger.warning(f"Groq keep-alive ping failed: {str(e)}")
+    
+    async def aclose(self) -> None:
+        """Close pooled connections owned by the running event loop"""
+        if self._client is not None and self._client_loop is asyncio.get_running_loop():
+            await self._client.close()
+        self._reset_client()
+    
+    def _digest(self, data: Union[bytes, memoryview]) -> str:
+        """SHA-256 digest of the raw upload bytes"""
+        return hashlib.sha256(data).hexdigest()
+
+    async def _hash_images(self, images: Sequence[Union[bytes, memoryview]]) -> List[str]:
+        """Digest each image in parallel"""
+        # hashlib releases the GIL on large buffers
+        with track_stage("image_hash"):
+            return list(await asyncio.gather(
+                *(asyncio.to_thread(self._digest, image) for image in images)
+            ))
+
+    def _cache_key(
+        self,
+        digests: Sequence[str],
+        symptoms: Optional[str],
+        template: PromptTemplate
+    ) -> str:
+        """Result cache key for one image or a set of views analyzed together"""
+        # Keyed on the primary model, so answers served by a fallback model are reused too
+        if len(digests) == 1:
+            return result_cache.make_key(
+                digests[0], symptoms, settings.vision_model, template.cache_tag()
+            )
+        combined_digest = hashlib.sha256(",".join(digests).encode()).hexdigest()
+        return result_cache.make_key(
+            combined_digest, symptoms, settings.vision_model, template.cache_tag(len(digests))
+        )
+
+    async def _lookup_cached(self, cache_key: str, use_cache: bool) -> Optional[str]:
+        """Return the cached diagnosis for a key, if any"""
+        if not use_cache:
+            result_cache.record_bypass()
+            return None
+        
+        cached = await result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Result cache hit for key {cache_key[:12]}")
+        return cached
+
+    async def _lookup_near_duplicate(
+        self,
+        image: PreparedImage,
+        digest: str,
+        cache_key: str,
+        symptoms: Optional[str],
+        template: PromptTemplate
+    ) -> Optional[str]:
+        """Reuse the diagnosis of a recently analyzed, visually near-identical image"""
+        if not settings.near_duplicate_enabled or not result_cache.enabled:
+            return None
+        
+        index = get_image_index()
+        with track_stage("near_duplicate_search"):
+            matches = index.find(image.phash)
+        for match_digest, distance in matches:
+            if match_digest == digest:
+                continue
+            cached = await result_cache.get(
+                self._cache_key([match_digest], symptoms, template), record=False
+            )
+            if cached is not None:
+                index.record_lookup(hit=True)
+                logger.info(
+                    f"Near-duplicate of image {match_digest[:12]} ({distance} bits apart), "
+                    f"reusing its diagnosis"
+                )
+                # Seed the exact key so the next identical upload is a plain cache hit
+                await result_cache.set(cache_key, cached)
+                return cached
+        index.record_lookup(hit=False)
+        return None
+
+    def _index_image(self, image: PreparedImage, digest: str) -> None:
+        """Make a freshly analyzed image findable by its near-duplicates"""
+        if settings.near_duplicate_enabled:
+            get_image_index().add(image.phash, digest)
+
+    async def _screen(self, image_data: Union[bytes, memoryview]) -> None:
+        """Reject an unusable image before it costs a model call (cache hits skip this)"""
+        if settings.image_quality_check:
+            await get_image_service().screen(image_data)
+
+    async def _prepare_images(
+        self,
+        images: Sequence[Union[bytes, memoryview]]
+    ) -> List[PreparedImage]:
+        """Downscale and re-encode images in parallel before paying for the upload"""
+        with track_stage("image_preprocess"):
+            return list(await asyncio.gather(
+                *(get_image_service().prepare(image) for image in images)
+            ))
+
+    def _build_messages(
+        self,
+        prepared: Sequence[PreparedImage],
+        symptoms: Optional[str],
+        template: PromptTemplate
+    ) -> List[Dict[str, Any]]:
+        """Build the multimodal chat messages for an analysis request"""
         try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            with track_stage("image_encode"):
+                messages = template.build_messages(prepared, symptoms)
         except Exception as e:
-            logger.error(f"Failed to encode image {image_path}: {str(e)}")
+            logger.error(f"Failed to encode image: {str(e)}")
             raise ModelError(f"Failed to process image: {str(e)}")
+        template.record_use()
+        return messages
 
-    def analyze_image_with_symptoms(
+    def _estimate_tokens(self, messages: List[Dict[str, Any]], image_count: int) -> int:
+        """Rough token cost of a vision request, charged against the upstream TPM budget"""
+        text = "".join(
+            part["text"] for part in messages[0]["content"] if part["type"] == "text"
+        )
+        # ~4 characters per token, plus the completion budget
+        return len(text) // 4 + image_count * settings.vision_tokens_per_image + 500
+
+    async def _complete(
+        self,
+        cache_key: str,
+        prepared: Sequence[PreparedImage],
+        symptoms: Optional[str],
+        template: PromptTemplate
+    ) -> str:
+        """Run one vision call and cache its diagnosis"""
+        messages = self._build_messages(prepared, symptoms, template)
+        payload_size = sum(len(image.data) for image in prepared)
+        tokens = self._estimate_tokens(messages, len(prepared))
+        
+        async def call(model: str):
+            await admission.admit_upstream(model, tokens)
+            limiter = model_limiters.get(model, settings.max_concurrent_vision_requests)
+            async with limiter.slot():
+                with track_stage("vision_call", model):
+                    return await self.client.chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        max_tokens=500,
+                        temperature=0.7
+                    )
+        
+        response = await vision_router.call(payload_size, call)
+        
+        diagnosis = response.choices[0].message.content
+        await result_cache.set(cache_key, diagnosis)
+        return diagnosis
+
+    async def analyze_image_with_symptoms(
         self, 
-        image_path: str, 
-        symptoms: Optional[str] = None
+        image_data: Union[bytes, memoryview], 
+        symptoms: Optional[str] = None,
+        use_cache: bool = True,
+        specialty: Optional[str] = None
     ) -> str:
         """Analyze image with optional symptom description"""
         try:
-            encoded_image = self.encode_image(image_path)
-            
-            # Construct query with symptoms if provided
-            query = self.system_prompt
-            if symptoms:
-                query += f"\n\nPatient's described symptoms: {symptoms}"
-            
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": query
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{encoded_image}",
-                            },
-                        },
-                    ],
-                }
+            template = prompt_templates.get(specialty)
+            digests = await self._hash_images([image_data])
+            cache_key = self._cache_key(digests, symptoms, template)
+            cached = await self._lookup_cached(cache_key, use_cache)
+            if cached is not None:
+                return cached
+            
+            await self._screen(image_data)
+            prepared = await self._prepare_images([image_data])
+            if use_cache:
+                similar = await self._lookup_near_duplicate(
+                    prepared[0], digests[0], cache_key, symptoms, template
+                )
+                if similar is not None:
+                    return similar
+            
+            diagnosis = await self._complete(cache_key, prepared, symptoms, template)
+            self._index_image(prepared[0], digests[0])
+            return diagnosis
+            
+        except (FileProcessingError, ServiceUnavailableError):
+            raise
+        except Exception as e:
+            logger.error(f"AI analysis failed: {str(e)}")
+            raise ModelError(f"Analysis failed: {str(e)}")
+
+    async def analyze_image_batch(
+        self,
+        images: Sequence[Union[bytes, memoryview]],
+        symptoms: Optional[str] = None,
+        use_cache: bool = True,
+        per_image: bool = True,
+        specialty: Optional[str] = None
+    ) -> BatchAnalysis:
+        """Analyze several views of one condition together and, optionally, one by one"""
+        try:
+            template = prompt_templates.get(specialty)
+            digests = await self._hash_images(images)
+            combined_key = self._cache_key(digests, symptoms, template)
+            # A single image is its own aggregate, so there is nothing to fan out
+            fan_out = per_image and len(images) > 1
+            image_keys = [self._cache_key([digest], symptoms, template) for digest in digests]
+            
+            combined = await self._lookup_cached(combined_key, use_cache)
+            per_image_results: List[Union[str, Exception, None]] = [None] * len(images)
+            if fan_out:
+                per_image_results = list(await asyncio.gather(
+                    *(self._lookup_cached(key, use_cache) for key in image_keys)
+                ))
+            pending = [
+                index for index, result in enumerate(per_image_results)
+                if fan_out and result is None
             ]
             
-            response = self.client.chat.completions.create(
-                messages=messages,
-                model=settings.vision_model,
-                max_tokens=500,
-                temperature=0.7
+            # Screen only images a model call still needs; rejected ones are reported per image
+            needed = list(range(len(images))) if combined is None else pending
+            screened = await asyncio.gather(
+                *(self._screen(images[index]) for index in needed),
+                return_exceptions=True
+            )
+            rejected: Dict[int, ImageQualityError] = {}
+            for index, outcome in zip(needed, screened):
+                if isinstance(outcome, ImageQualityError):
+                    rejected[index] = outcome
+                elif isinstance(outcome, BaseException):
+                    raise outcome
+            accepted = [index for index in range(len(images)) if index not in rejected]
+            if not accepted:
+                raise rejected[needed[0]]
+            for index, error in rejected.items():
+                per_image_results[index] = error
+            pending = [index for index in pending if index not in rejected]
+            if rejected and combined is None:
+                combined_key = self._cache_key(
+                    [digests[index] for index in accepted], symptoms, template
+                )
+                combined = await self._lookup_cached(combined_key, use_cache)
+            
+            # Preprocess each image once, and only if a pending call still needs it
+            needed = accepted if combined is None else pending
+            prepared = dict(zip(
+                needed, await self._prepare_images([images[index] for index in needed])
+            ))
+            
+            # Bound this batch's share of the model's in-flight slots
+            slots = asyncio.Semaphore(settings.batch_max_concurrency)
+            
+            async def analyze_one(index: int) -> str:
+                async with slots:
+                    diagnosis = await self._complete(
+                        image_keys[index], [prepared[index]], symptoms, template
+                    )
+                self._index_image(prepared[index], digests[index])
+                return diagnosis
+            
+            async def analyze_combined() -> str:
+                if combined is not None:
+                    return combined
+                return await self._complete(
+                    combined_key,
+                    [prepared[index] for index in accepted],
+                    symptoms,
+                    template
+                )
+            
+            # The combined call and the per-image calls all run concurrently
+            outcomes = await asyncio.gather(
+                analyze_combined(),
+                *(analyze_one(index) for index in pending),
+                return_exceptions=True
             )
             
-            return response.choices[0].message.content
+            aggregate = outcomes[0]
+            if isinstance(aggregate, BaseException):
+                raise aggregate
+            for index, outcome in zip(pending, outcomes[1:]):
+                if isinstance(outcome, BaseException):
+                    logger.warning(f"Batch image {index} analysis failed: {str(outcome)}")
+                per_image_results[index] = outcome
+            if per_image and len(images) == 1:
+                per_image_results = [aggregate]
             
+            return BatchAnalysis(aggregate, per_image_results)
+            
+        except (FileProcessingError, ServiceUnavailableError):
+            raise
         except Exception as e:
-            logger.error(f"AI analysis failed: {str(e)}")
+            logger.error(f"AI batch analysis failed: {str(e)}")
             raise ModelError(f"Analysis failed: {str(e)}")
 
-    def transcribe_audio(self, audio_path: str) -> str:
-        """Transcribe audio to text using Groq Whisper"""
+    async def stream_image_analysis(
+        self,
+        image_data: Union[bytes, memoryview],
+        symptoms: Optional[str] = None,
+        use_cache: bool = True,
+        specialty: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Analyze image with optional symptoms, yielding text as it is generated"""
         try:
-            with open(audio_path, "rb") as audio_file:
-                transcription = self.client.audio.transcriptions.create(
-                    model=settings.stt_model,
-                    file=audio_file,
-                    language="en"
+            template = prompt_templates.get(specialty)
+            digests = await self._hash_images([image_data])
+            cache_key = self._cache_key(digests, symptoms, template)
+            cached = await self._lookup_cached(cache_key, use_cache)
+            if cached is not None:
+                yield cached
+                return
+            
+            await self._screen(image_data)
+            prepared = await self._prepare_images([image_data])
+            if use_cache:
+                similar = await self._lookup_near_duplicate(
+                    prepared[0], digests[0], cache_key, symptoms, template
                 )
+                if similar is not None:
+                    yield similar
+                    return
+            
+            messages = self._build_messages(prepared, symptoms, template)
+            
+            tokens = self._estimate_tokens(messages, len(prepared))
+            
+            async def open_stream(model: str):
+                await admission.admit_upstream(model, tokens)
+                # The model slot stays held until the stream has been consumed
+                slot = AsyncExitStack()
+                limiter = model_limiters.get(model, settings.max_concurrent_vision_requests)
+                await slot.enter_async_context(limiter.slot())
+                try:
+                    stream = await self.client.chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        max_tokens=500,
+                        temperature=0.7,
+                        stream=True
+                    )
+                except BaseException:
+                    await slot.aclose()
+                    raise
+                return model, stream, slot
+            
+            parts = []
+            started = time.perf_counter()
+            # Retries and fallback cover opening the stream; sent tokens cannot be replayed
+            model, stream, slot = await vision_router.call(
+                len(prepared[0].data), open_stream, hedge=False, observe_latency=False
+            )
+            async with slot:
+                with track_stage("vision_stream", model):
+                    try:
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                if not parts:
+                                    STAGE_DURATION.observe(
+                                        time.perf_counter() - started,
+                                        stage="vision_first_token",
+                                        model=model
+                                    )
+                                parts.append(delta)
+                                yield delta
+                    finally:
+                        # A client disconnect closes this generator mid-stream; release the connection
+                        await stream.close()
+            
+            await result_cache.set(cache_key, "".join(parts))
+            self._index_image(prepared[0], digests[0])
+            
+        except (FileProcessingError, ServiceUnavailableError):
+            raise
+        except Exception as e:
+            logger.error(f"AI streaming analysis failed: {str(e)}")
+            raise ModelError(f"Analysis failed: {str(e)}")
+
+    async def transcribe_audio(
+        self,
+        audio_data: Union[bytes, memoryview],
+        filename: str = "audio.wav"
+    ) -> str:
+        """Transcribe audio to text using Groq Whisper"""
+        try:
+            audio_bytes = bytes(audio_data)
+            
+            async def call(model: str):
+                await admission.admit_upstream(model)
+                limiter = model_limiters.get(model, settings.max_concurrent_stt_requests)
+                async with limiter.slot():
+                    with track_stage("transcription", model):
+                        return await self.client.audio.transcriptions.create(
+                            model=model,
+                            file=(filename, audio_bytes),
+                            language="en"
+                        )
+            
+            transcription = await stt_router.call(len(audio_bytes), call)
             return transcription.text
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Audio transcription failed: {str(e)}")
             raise ModelError(f"Audio transcription failed: {str(e)}")
 
-# Global AI service instance
-ai_service = AIService()
\ No newline at end of file
+# Global AI service instance, built on first use
+get_ai_service = LazyService(AIService)
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Audio preprocessing before recordings are sent to the speech-to-text model
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from io import BytesIO
+from typing import NamedTuple, Optional, Union
+from shutil import which
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError
+from app.core.lazy import LazyService
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+AUDIO_BYTES = metrics.counter(
+    "ai_doctor_audio_bytes_total",
+    "Recording bytes before and after preprocessing",
+    ("stage",)
+)
+
+# ffmpeg demuxer names for upload extensions that differ from the extension itself
+SOURCE_FORMATS = {
+    "m4a": "mp4",
+    "mpga": "mp3",
+    "oga": "ogg",
+    "opus": "ogg"
+}
+
+MIME_TYPES = {
+    "flac": "audio/flac",
+    "ogg": "audio/ogg",
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav"
+}
+
+class PreparedAudio(NamedTuple):
+    """Recording ready to be sent to the speech-to-text model"""
+    data: bytes
+    filename: str
+    mime_type: str
+    duration: float
+    trimmed: float
+    original_size: int
+
+def prepare_audio(
+    data: bytes,
+    extension: str,
+    sample_rate: int,
+    output_format: str,
+    silence_threshold: float,
+    silence_padding_ms: int,
+    max_duration: float
+) -> PreparedAudio:
+    """Decode, trim silence, downmix and re-encode a recording (runs in a worker process)"""
+    from pydub import AudioSegment
+    from pydub.silence import detect_leading_silence
+    
+    source_format = extension.lstrip(".").lower() or None
+    source_format = SOURCE_FORMATS.get(source_format, source_format)
+    sound = AudioSegment.from_file(BytesIO(data), format=source_format)
+    original_duration = len(sound) / 1000
+
+    # Trim leading and trailing silence, keeping a little padding around speech
+    start = detect_leading_silence(sound, silence_threshold=silence_threshold)
+    end = len(sound) - detect_leading_silence(sound.reverse(), silence_threshold=silence_threshold)
+    if end <= start:
+        raise FileProcessingError("No speech detected in the recording")
+    sound = sound[max(0, start - silence_padding_ms):min(len(sound), end + silence_padding_ms)]
+
+    duration = len(sound) / 1000
+    if duration > max_duration:
+        raise FileProcessingError(
+            f"Recording too long: {duration:.0f}s of audio. Maximum is {max_duration:.0f} seconds."
+        )
+
+    sound = sound.set_channels(1).set_frame_rate(sample_rate).set_sample_width(2)
+
+    # Compressed formats need ffmpeg; 16 kHz mono WAV is still far smaller than most uploads
+    if output_format != "wav" and not which("ffmpeg"):
+        output_format = "wav"
+    output = BytesIO()
+    sound.export(output, format=output_format)
+    encoded = output.getvalue()
+
+    return PreparedAudio(
+        data=encoded,
+        filename=f"audio.{output_format}",
+        mime_type=MIME_TYPES.get(output_format, "application/octet-stream"),
+        duration=duration,
+        trimmed=original_duration - duration,
+        original_size=len(data)
+    )
+
+class AudioIngestService:
+    """Service for CPU-bound audio preprocessing off the event loop"""
+
+    def __init__(self):
+        self._executor: Optional[Executor] = None
+        self.recordings_processed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds_trimmed = 0.0
+        if settings.audio_ingest_format != "wav" and not which("ffmpeg"):
+            logger.warning(
+                f"ffmpeg not found: recordings will be sent as WAV instead of "
+                f"{settings.audio_ingest_format}, and only WAV uploads can be decoded"
+            )
+
+    def _get_executor(self) -> Optional[Executor]:
+        """Create the worker pool on first use"""
+        if self._executor is None and settings.audio_preprocess_workers > 0:
+            # Spawned workers inherit neither the listening socket nor the event loop,
+            # so they cannot outlive the server holding its port
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.audio_preprocess_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def prepare(self, audio_data: Union[bytes, memoryview], filename: str) -> PreparedAudio:
+        """Preprocess a recording in the worker pool"""
+        extension = os.path.splitext(filename or "")[1]
+        try:
+            loop = asyncio.get_running_loop()
+            prepared = await loop.run_in_executor(
+                self._get_executor(),
+                prepare_audio,
+                bytes(audio_data),
+                extension,
+                settings.audio_sample_rate,
+                settings.audio_ingest_format,
+                settings.audio_silence_threshold,
+                settings.audio_silence_padding_ms,
+                settings.max_recording_duration
+            )
+        except FileProcessingError:
+            raise
+        except Exception as e:
+            logger.error(f"Audio preprocessing failed: {str(e)}")
+            raise FileProcessingError(
+                "Could not read the recording. Please upload a valid audio file."
+            )
+
+        self.recordings_processed += 1
+        self.bytes_in += prepared.original_size
+        self.bytes_out += len(prepared.data)
+        self.seconds_trimmed += prepared.trimmed
+        AUDIO_BYTES.inc(prepared.original_size, stage="original")
+        AUDIO_BYTES.inc(len(prepared.data), stage="prepared")
+        logger.info(
+            f"Audio prepared: {prepared.original_size} -> {len(prepared.data)} bytes "
+            f"({prepared.duration:.1f}s {prepared.mime_type}, trimmed {prepared.trimmed:.1f}s)"
+        )
+        return prepared
+
+    def stats(self) -> dict:
+        """Preprocessing counters"""
+        return {
+            "recordings_processed": self.recordings_processed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "seconds_trimmed": round(self.seconds_trimmed, 1)
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker pool and wait for its processes to exit (blocking)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+# Global audio ingest service instance, built on first use
+get_audio_ingest_service = LazyService(AudioIngestService)
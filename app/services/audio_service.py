@@ -1,46 +1,116 @@
 """
 Audio processing services
 """
-import os
+import re
+import asyncio
+import hashlib
 import logging
-from typing import Optional
-from gtts import gTTS
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.core.cache import LRUCache
 from app.core.config import settings
 from app.core.exceptions import AudioProcessingError
+from app.core.lazy import LazyService
+from app.core.metrics import metrics, track_stage
+from app.services.tts_backends import TTSBackend, create_tts_backend
 
 logger = logging.getLogger(__name__)
 
+TTS_CACHE_LOOKUPS = metrics.counter(
+    "ai_doctor_tts_cache_lookups_total",
+    "Synthesized audio cache lookups by outcome",
+    ("result",)
+)
+
+# Sentence boundaries: terminal punctuation followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
 class AudioService:
     """Service for audio processing and text-to-speech"""
     
     def __init__(self):
-        self.temp_dir = "temp_audio"
-        os.makedirs(self.temp_dir, exist_ok=True)
+        self.backend: TTSBackend = create_tts_backend(settings.tts_backend)
+        self.cache: LRUCache[bytes] = LRUCache(
+            max_entries=settings.tts_cache_max_entries,
+            max_bytes=settings.tts_cache_max_bytes
+        )
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
     
-    def text_to_speech(self, text: str, output_path: Optional[str] = None) -> str:
-        """Convert text to speech using gTTS"""
+    def synthesize(self, text: str) -> bytes:
+        """Convert text to audio bytes in memory, reusing cached audio for repeated text"""
+        # Clean text for better speech synthesis
+        return self._synthesize_cleaned(self._clean_text_for_speech(text))
+    
+    def _synthesize_cleaned(self, cleaned_text: str) -> bytes:
+        """Synthesize already-cleaned text, consulting the audio cache first"""
         try:
-            if not output_path:
-                output_path = os.path.join(self.temp_dir, "response.mp3")
-            
-            # Clean text for better speech synthesis
-            cleaned_text = self._clean_text_for_speech(text)
+            cache_key = self._cache_key(cleaned_text)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache_hits += 1
+                TTS_CACHE_LOOKUPS.inc(result="hit")
+                return cached
+            self.cache_misses += 1
+            TTS_CACHE_LOOKUPS.inc(result="miss")
             
-            tts = gTTS(
-                text=cleaned_text,
-                lang="en",
-                slow=False,
-                tld="com"  # Use .com domain for better quality
-            )
+            with track_stage("tts_synthesis", self.backend.name):
+                audio_bytes = self.backend.synthesize(cleaned_text)
             
-            tts.save(output_path)
-            logger.info(f"Audio saved to {output_path}")
-            return output_path
+            self.cache.set(cache_key, audio_bytes, len(audio_bytes))
+            logger.info(f"Synthesized {len(audio_bytes)} bytes of audio with {self.backend.name}")
+            return audio_bytes
             
         except Exception as e:
             logger.error(f"Text-to-speech failed: {str(e)}")
             raise AudioProcessingError(f"Failed to generate audio: {str(e)}")
     
+    def split_sentences(self, text: str) -> List[str]:
+        """Clean text and split it into sentence-sized synthesis chunks"""
+        cleaned_text = self._clean_text_for_speech(text)
+        chunks: List[str] = []
+        for sentence in SENTENCE_BOUNDARY.split(cleaned_text.strip()):
+            if not sentence:
+                continue
+            # Merge fragments too short to be worth a separate request
+            if chunks and len(chunks[-1]) < settings.tts_min_chunk_chars:
+                chunks[-1] = f"{chunks[-1]} {sentence}"
+            else:
+                chunks.append(sentence)
+        return chunks
+    
+    async def stream_speech(self, text: str) -> AsyncIterator[bytes]:
+        """Synthesize sentences concurrently and yield their audio in order"""
+        sentences = self.split_sentences(text)
+        if not sentences:
+            raise AudioProcessingError("No text to synthesize")
+        if not self.backend.concatenable:
+            # Backends with per-file headers render the whole text at once
+            sentences = [" ".join(sentences)]
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.tts_workers, thread_name_prefix="tts"
+            )
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(self._executor, self._synthesize_cleaned, sentence)
+            for sentence in sentences
+        ]
+        try:
+            for future in futures:
+                yield await future
+        finally:
+            # Drop queued sentences if the client went away
+            for future in futures:
+                future.cancel()
+    
+    def _cache_key(self, cleaned_text: str) -> str:
+        """Content-addressed key for synthesized audio"""
+        namespace = self.backend.cache_namespace()
+        return hashlib.sha256(f"{namespace}\0{cleaned_text}".encode("utf-8")).hexdigest()
+    
     def _clean_text_for_speech(self, text: str) -> str:
         """Clean text for better speech synthesis"""
         # Remove markdown formatting
@@ -62,24 +132,22 @@ class AudioService:
         
         return text
     
-    def get_audio_as_bytes(self, audio_path: str) -> bytes:
-        """Read audio file and return as bytes"""
-        try:
-            with open(audio_path, "rb") as audio_file:
-                return audio_file.read()
-        except Exception as e:
-            logger.error(f"Failed to read audio file {audio_path}: {str(e)}")
-            raise AudioProcessingError(f"Failed to read audio file: {str(e)}")
+    def stats(self) -> Dict[str, Any]:
+        """TTS cache counters"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+            **self.cache.stats()
+        }
     
-    def cleanup_temp_files(self):
-        """Clean up temporary audio files"""
-        try:
-            for filename in os.listdir(self.temp_dir):
-                file_path = os.path.join(self.temp_dir, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-        except Exception as e:
-            logger.warning(f"Failed to cleanup temp files: {str(e)}")
+    def shutdown(self) -> None:
+        """Stop the synthesis worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
-# Global audio service instance
-audio_service = AudioService()
\ No newline at end of file
+# Global audio service instance, built on first use
+get_audio_service = LazyService(AudioService)
\ No newline at end of file
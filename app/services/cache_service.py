@@ -0,0 +1,189 @@
+"""
+Diagnosis result caching keyed on image content and request inputs
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+import orjson
+from app.core.cache import DiskCache, LRUCache
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = metrics.counter(
+    "ai_doctor_result_cache_lookups_total",
+    "Diagnosis result cache lookups by outcome",
+    ("result",)
+)
+
+class ResultCache:
+    """Two-tier cache of diagnosis texts: in-process LRU backed by optional SQLite"""
+
+    def __init__(self):
+        self.enabled = settings.result_cache_enabled
+        self.memory: LRUCache[str] = LRUCache(
+            max_entries=settings.result_cache_max_entries,
+            ttl=settings.result_cache_ttl
+        )
+        # Finished results by result ID, kept even when result caching is off; the
+        # SQLite store lets any worker serve an ID another worker handed out
+        self.results: LRUCache[bytes] = LRUCache(
+            max_entries=settings.result_cache_max_entries,
+            ttl=settings.result_cache_ttl
+        )
+        self.result_store: Optional[DiskCache] = None
+        if settings.result_store_path:
+            try:
+                self.result_store = DiskCache(
+                    settings.result_store_path,
+                    max_bytes=settings.result_store_max_bytes,
+                    ttl=settings.result_cache_ttl
+                )
+            except Exception as e:
+                logger.warning(f"Shared result store disabled: {str(e)}")
+        self.disk: Optional[DiskCache] = None
+        if self.enabled and settings.result_cache_path:
+            try:
+                self.disk = DiskCache(
+                    settings.result_cache_path,
+                    max_bytes=settings.result_cache_max_bytes,
+                    ttl=settings.result_cache_ttl
+                )
+            except Exception as e:
+                logger.warning(f"Disk result cache disabled: {str(e)}")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def normalize_symptoms(symptoms: Optional[str]) -> str:
+        """Collapse case and whitespace so equivalent descriptions share a key"""
+        if not symptoms:
+            return ""
+        return " ".join(symptoms.lower().split())
+
+    def make_key(
+        self,
+        image_digest: str,
+        symptoms: Optional[str],
+        model: str,
+        prompt_version: str
+    ) -> str:
+        """Build the cache key for an analysis request"""
+        hasher = hashlib.sha256()
+        for part in (
+            image_digest,
+            self.normalize_symptoms(symptoms),
+            model,
+            prompt_version
+        ):
+            hasher.update(part.encode("utf-8"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    async def get(self, key: str, record: bool = True) -> Optional[str]:
+        """Look up a result in memory, then on disk; record=False leaves the counters alone"""
+        if not self.enabled:
+            return None
+
+        value = self.memory.get(key)
+        if value is not None:
+            if record:
+                self.hits += 1
+                CACHE_LOOKUPS.inc(result="memory_hit")
+            return value
+
+        if self.disk is not None:
+            try:
+                raw = await asyncio.to_thread(self.disk.get, key)
+            except Exception as e:
+                logger.warning(f"Disk result cache read failed: {str(e)}")
+                raw = None
+            if raw is not None:
+                value = raw.decode("utf-8")
+                self.memory.set(key, value, len(value))
+                if record:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    CACHE_LOOKUPS.inc(result="disk_hit")
+                return value
+
+        if record:
+            self.misses += 1
+            CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        """Store a result in every enabled tier"""
+        if not self.enabled:
+            return
+
+        self.memory.set(key, value, len(value))
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value.encode("utf-8"))
+            except Exception as e:
+                logger.warning(f"Disk result cache write failed: {str(e)}")
+
+    async def store_result(self, diagnosis: str, confidence: float) -> str:
+        """Keep a finished result as compact JSON under an ID derived from its content"""
+        content = orjson.dumps(
+            {"diagnosis": diagnosis, "confidence": confidence},
+            option=orjson.OPT_SORT_KEYS
+        )
+        result_id = hashlib.sha256(content).hexdigest()[:32]
+        if self.results.get(result_id) is not None:
+            return result_id
+
+        payload = orjson.dumps({
+            "result_id": result_id,
+            "diagnosis": diagnosis,
+            "confidence": confidence,
+            "audio_available": True
+        })
+        self.results.set(result_id, payload, len(payload))
+        if self.result_store is not None:
+            try:
+                await asyncio.to_thread(self.result_store.set, result_id, payload)
+            except Exception as e:
+                logger.warning(f"Shared result store write failed: {str(e)}")
+        return result_id
+
+    async def load_result(self, result_id: str) -> Optional[bytes]:
+        """JSON payload of a stored result, if it has not expired"""
+        payload = self.results.get(result_id)
+        if payload is None and self.result_store is not None:
+            try:
+                payload = await asyncio.to_thread(self.result_store.get, result_id)
+            except Exception as e:
+                logger.warning(f"Shared result store read failed: {str(e)}")
+            if payload is not None:
+                self.results.set(result_id, payload, len(payload))
+        return payload
+
+    def record_bypass(self) -> None:
+        """Count a request that skipped the cache on purpose"""
+        self.bypassed += 1
+        CACHE_LOOKUPS.inc(result="bypass")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory": self.memory.stats(),
+            "stored_results": self.results.stats(),
+            "result_store": self.result_store.stats() if self.result_store is not None else None,
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
+
+# Global result cache instance
+result_cache = ResultCache()
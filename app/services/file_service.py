@@ -1,13 +1,16 @@
 """
 File handling services
 """
+import asyncio
 import os
 import uuid
 import logging
-from typing import Optional, Tuple
+from typing import Optional, Sequence
 from fastapi import UploadFile
 from app.core.config import settings
-from app.core.exceptions import FileProcessingError
+from app.core.exceptions import FileProcessingError, FileTooLargeError
+from app.core.lazy import LazyService
+from app.core.metrics import track_stage
 
 logger = logging.getLogger(__name__)
 
@@ -17,79 +20,90 @@ class FileService:
     def __init__(self):
         os.makedirs(settings.upload_dir, exist_ok=True)
     
-    def save_uploaded_file(self, file: UploadFile) -> str:
-        """Save uploaded file and return the file path"""
+    async def read_upload(
+        self,
+        file: UploadFile,
+        allowed_extensions: Optional[Sequence[str]] = None,
+        max_size: Optional[int] = None
+    ) -> memoryview:
+        """Read an upload into memory, enforcing the size limit while streaming"""
+        allowed_extensions = allowed_extensions or settings.allowed_extensions
+        max_size = max_size or settings.max_file_size
         try:
-            # Validate file
-            self._validate_file(file)
+            with track_stage("upload_validate"):
+                self._validate_file(file, allowed_extensions)
+                
+                # Reject early when the multipart parser already knows the size
+                if file.size is not None and file.size > max_size:
+                    raise self._too_large(max_size)
+                
+                buffer = bytearray()
+                while True:
+                    chunk = await file.read(settings.upload_chunk_size)
+                    if not chunk:
+                        break
+                    if len(buffer) + len(chunk) > max_size:
+                        raise self._too_large(max_size)
+                    buffer += chunk
+                
+                if not buffer:
+                    raise FileProcessingError("Uploaded file is empty")
             
-            # Generate unique filename
-            file_extension = self._get_file_extension(file.filename)
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            file_path = os.path.join(settings.upload_dir, unique_filename)
+            data = memoryview(buffer)
+            if settings.retain_uploads:
+                with track_stage("upload_save"):
+                    await asyncio.to_thread(
+                        self.save_bytes, data, self._get_file_extension(file.filename)
+                    )
+            return data
             
-            # Save file
+        except FileProcessingError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to read upload: {str(e)}")
+            raise FileProcessingError(f"Failed to read upload: {str(e)}")
+    
+    def save_bytes(self, data: memoryview, extension: str = "") -> str:
+        """Write an in-memory upload to the upload directory for audit retention"""
+        try:
+            file_path = os.path.join(settings.upload_dir, f"{uuid.uuid4()}{extension}")
             with open(file_path, "wb") as buffer:
-                content = file.file.read()
-                buffer.write(content)
-            
-            logger.info(f"File saved: {file_path}")
+                buffer.write(data)
+            logger.info(f"Upload retained: {file_path}")
             return file_path
-            
         except Exception as e:
             logger.error(f"Failed to save file: {str(e)}")
             raise FileProcessingError(f"Failed to save file: {str(e)}")
     
-    def _validate_file(self, file: UploadFile) -> None:
-        """Validate uploaded file"""
+    def _validate_file(self, file: UploadFile, allowed_extensions: Sequence[str]) -> None:
+        """Validate uploaded file name and type"""
         if not file.filename:
             raise FileProcessingError("No file provided")
         
         # Check file extension
         file_extension = self._get_file_extension(file.filename)
-        if file_extension.lower() not in settings.allowed_extensions:
-            raise FileProcessingError(
-                f"File type not allowed. Supported formats: {', '.join(settings.allowed_extensions)}"
-            )
-        
-        # Check file size
-        file.file.seek(0, 2)  # Seek to end
-        file_size = file.file.tell()
-        file.file.seek(0)  # Reset to beginning
-        
-        if file_size > settings.max_file_size:
+        if file_extension.lower() not in allowed_extensions:
             raise FileProcessingError(
-                f"File too large. Maximum size: {settings.max_file_size / (1024*1024):.1f}MB"
+                f"File type not allowed. Supported formats: {', '.join(allowed_extensions)}"
             )
     
+    def _too_large(self, max_size: int) -> FileTooLargeError:
+        """Build the error raised for oversized uploads"""
+        return FileTooLargeError(
+            f"File too large. Maximum size: {max_size / (1024*1024):.1f}MB"
+        )
+    
     def _get_file_extension(self, filename: str) -> str:
         """Extract file extension from filename"""
         return os.path.splitext(filename)[1]
     
-    def cleanup_file(self, file_path: str) -> None:
-        """Remove file from filesystem"""
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"File cleaned up: {file_path}")
-        except Exception as e:
-            logger.warning(f"Failed to cleanup file {file_path}: {str(e)}")
-    
-    def cleanup_old_files(self, max_age_hours: int = 24) -> None:
-        """Clean up old uploaded files"""
-        try:
-            import time
-            current_time = time.time()
-            
-            for filename in os.listdir(settings.upload_dir):
-                file_path = os.path.join(settings.upload_dir, filename)
-                if os.path.isfile(file_path):
-                    file_age = current_time - os.path.getctime(file_path)
-                    if file_age > (max_age_hours * 3600):
-                        os.remove(file_path)
-                        logger.info(f"Cleaned up old file: {file_path}")
-        except Exception as e:
-            logger.warning(f"Failed to cleanup old files: {str(e)}")
+    async def read_audio_upload(self, file: UploadFile) -> memoryview:
+        """Read an audio upload, validated against the audio types and size limit"""
+        return await self.read_upload(
+            file,
+            allowed_extensions=settings.allowed_audio_extensions,
+            max_size=settings.max_audio_file_size
+        )
 
-# Global file service instance
-file_service = FileService()
\ No newline at end of file
+# Global file service instance, built on first use
+get_file_service = LazyService(FileService)
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Perceptual-hash index of recently analyzed images for near-duplicate reuse
+
+A re-photographed or re-compressed image has different bytes, so it misses the
+result cache, but its 64-bit DCT hash differs from the original's in only a few
+bits. Hashes live in a NumPy uint64 ring buffer and are searched in one
+vectorized XOR and popcount.
+"""
+import logging
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+from app.core.config import settings
+from app.core.lazy import LazyService
+from app.core.metrics import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUPLICATE_LOOKUPS = metrics.counter(
+    "ai_doctor_near_duplicate_lookups_total",
+    "Near-duplicate image lookups by outcome",
+    ("result",)
+)
+
+# The image is reduced to SAMPLE_SIZE x SAMPLE_SIZE and the lowest HASH_SIZE x HASH_SIZE
+# DCT frequencies become the 64 hash bits
+SAMPLE_SIZE = 32
+HASH_SIZE = 8
+
+@lru_cache(maxsize=1)
+def _dct_matrix(size: int) -> "np.ndarray":
+    """DCT-II basis, so a 2-D transform is two matrix products"""
+    import numpy as np
+
+    frequencies = np.arange(size)[:, None]
+    positions = np.arange(size)[None, :]
+    return np.cos(np.pi * (2 * positions + 1) * frequencies / (2 * size)).astype(np.float32)
+
+def perceptual_hash(image: "Image.Image") -> int:
+    """64-bit pHash of a decoded image; near-identical photos differ in few bits"""
+    import numpy as np
+    from PIL import Image
+
+    sample = image.convert("L").resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(sample, dtype=np.float32)
+    dct = _dct_matrix(SAMPLE_SIZE)
+    low = (dct @ pixels @ dct.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is overall brightness, so it is left out of the median
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+class NearDuplicateIndex:
+    """Fixed-size ring buffer of image hashes; the oldest entry is overwritten first"""
+
+    def __init__(self):
+        import numpy as np
+
+        self.capacity = max(1, settings.near_duplicate_capacity)
+        self.threshold = settings.near_duplicate_threshold
+        self.ttl = settings.near_duplicate_ttl
+        self._hashes = np.zeros(self.capacity, dtype=np.uint64)
+        self._added = np.zeros(self.capacity, dtype=np.float64)
+        self._digests: List[str] = [""] * self.capacity
+        self._next = 0
+        self._size = 0
+        self.lookups = 0
+        self.hits = 0
+        self.evicted = 0
+
+    def add(self, phash: int, digest: str) -> None:
+        """Remember the hash of an analyzed image and the SHA-256 digest of its upload"""
+        if self._size == self.capacity:
+            self.evicted += 1
+        else:
+            self._size += 1
+        slot = self._next
+        self._hashes[slot] = phash
+        self._added[slot] = time.monotonic()
+        self._digests[slot] = digest
+        self._next = (slot + 1) % self.capacity
+
+    def find(self, phash: int, limit: int = 3) -> List[Tuple[str, int]]:
+        """Digests of indexed images within the threshold, nearest (then newest) first"""
+        import numpy as np
+
+        size = self._size
+        if size == 0:
+            return []
+        distances = np.bitwise_count(self._hashes[:size] ^ np.uint64(phash))
+        close = distances <= self.threshold
+        if self.ttl > 0:
+            close &= self._added[:size] >= time.monotonic() - self.ttl
+        candidates = np.flatnonzero(close)
+        order = candidates[np.lexsort((-self._added[candidates], distances[candidates]))]
+
+        matches: List[Tuple[str, int]] = []
+        seen = set()
+        for slot in order:
+            digest = self._digests[slot]
+            if digest in seen:
+                continue
+            seen.add(digest)
+            matches.append((digest, int(distances[slot])))
+            if len(matches) == limit:
+                break
+        return matches
+
+    def record_lookup(self, hit: bool) -> None:
+        """Count a lookup; a hit means a prior diagnosis was reused"""
+        self.lookups += 1
+        if hit:
+            self.hits += 1
+        NEAR_DUPLICATE_LOOKUPS.inc(result="hit" if hit else "miss")
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size, eviction and hit-rate counters"""
+        return {
+            "entries": self._size,
+            "capacity": self.capacity,
+            "bytes": self._hashes.nbytes + self._added.nbytes,
+            "threshold_bits": self.threshold,
+            "ttl": self.ttl,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "evicted": self.evicted
+        }
+
+# Global near-duplicate index instance, built on first use
+get_image_index = LazyService(NearDuplicateIndex)
@@ -0,0 +1,130 @@
+"""
+Local quality checks that reject unusable images before the vision model call
+"""
+from io import BytesIO
+from typing import NamedTuple, Optional
+
+# Checks run on the image reduced to this longest edge, so thresholds do not
+# depend on the camera's resolution
+ANALYSIS_EDGE = 512
+
+# Luminance at or beyond these values counts as crushed to black or blown to white
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+# Mean luminance outside this range is too dark or too bright even without clipping
+MIN_MEAN_BRIGHTNESS = 40
+MAX_MEAN_BRIGHTNESS = 225
+
+# Chroma ranges of human skin in YCbCr, across skin tones
+SKIN_CB = (77, 127)
+SKIN_CR = (133, 173)
+
+# What the user should do about each rejection
+REJECTION_MESSAGES = {
+    "unreadable": "The image could not be read. Please upload a valid JPEG, PNG or WebP file.",
+    "too_small": (
+        "The image is too small ({width}x{height}). "
+        "Please upload a photo at least {min_edge} pixels on each side."
+    ),
+    "too_dark": "The image is too dark to assess. Please retake the photo in good, even light.",
+    "too_bright": (
+        "The image is overexposed. "
+        "Please retake the photo out of direct sunlight and without flash."
+    ),
+    "blurry": (
+        "The image is too blurry to assess. Please hold the camera steady, "
+        "tap to focus on the affected area and retake the photo."
+    ),
+    "no_skin": (
+        "No skin is visible in the image. "
+        "Please take a close-up photo of the affected area."
+    )
+}
+
+class QualityReport(NamedTuple):
+    """Measurements of one image and the reason it was rejected, if it was"""
+    reason: Optional[str]
+    width: int = 0
+    height: int = 0
+    brightness: float = 0.0
+    dark_share: float = 0.0
+    bright_share: float = 0.0
+    sharpness: float = 0.0
+    skin_ratio: float = 0.0
+
+    @property
+    def accepted(self) -> bool:
+        return self.reason is None
+
+    def message(self, min_edge: int) -> str:
+        """Actionable explanation of the rejection"""
+        return REJECTION_MESSAGES[self.reason].format(
+            width=self.width, height=self.height, min_edge=min_edge
+        )
+
+def assess_image(
+    data: bytes,
+    min_edge: int,
+    min_sharpness: float,
+    max_clipped: float,
+    min_skin_ratio: float
+) -> QualityReport:
+    """Decode a reduced copy of an image and measure it (runs in a worker process)"""
+    import numpy as np
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            width, height = image.size
+            # JPEGs decode straight at a fraction of full size
+            image.draft("RGB", (ANALYSIS_EDGE, ANALYSIS_EDGE))
+            image.load()
+            if min(width, height) < min_edge:
+                return QualityReport("too_small", width, height)
+            image.thumbnail((ANALYSIS_EDGE, ANALYSIS_EDGE), Image.Resampling.BILINEAR)
+            rgb = image.convert("RGB")
+    except Exception:
+        return QualityReport("unreadable")
+
+    luma = np.asarray(rgb.convert("L"), dtype=np.float32)
+    histogram = np.bincount(luma.astype(np.uint8).ravel(), minlength=256)
+    pixels = luma.size
+    brightness = float(luma.mean())
+    dark_share = float(histogram[:DARK_LEVEL + 1].sum() / pixels)
+    bright_share = float(histogram[BRIGHT_LEVEL:].sum() / pixels)
+
+    # Variance of the 4-neighbour Laplacian: sharp edges give large responses
+    laplacian = (
+        luma[:-2, 1:-1] + luma[2:, 1:-1] + luma[1:-1, :-2] + luma[1:-1, 2:]
+        - 4 * luma[1:-1, 1:-1]
+    )
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+
+    chroma = np.asarray(rgb.convert("YCbCr"))
+    cb, cr = chroma[..., 1], chroma[..., 2]
+    skin = (
+        (cb >= SKIN_CB[0]) & (cb <= SKIN_CB[1])
+        & (cr >= SKIN_CR[0]) & (cr <= SKIN_CR[1])
+    )
+    skin_ratio = float(skin.mean())
+
+    reason = None
+    if dark_share > max_clipped or brightness < MIN_MEAN_BRIGHTNESS:
+        reason = "too_dark"
+    elif bright_share > max_clipped or brightness > MAX_MEAN_BRIGHTNESS:
+        reason = "too_bright"
+    elif sharpness < min_sharpness:
+        reason = "blurry"
+    elif skin_ratio < min_skin_ratio:
+        reason = "no_skin"
+
+    return QualityReport(
+        reason,
+        width,
+        height,
+        round(brightness, 1),
+        round(dark_share, 4),
+        round(bright_share, 4),
+        round(sharpness, 1),
+        round(skin_ratio, 4)
+    )
@@ -0,0 +1,194 @@
+"""
+Image preprocessing before images are sent to the vision model
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, NamedTuple, Optional, Union
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError, ImageQualityError
+from app.core.lazy import LazyService
+from app.core.metrics import metrics, track_stage
+from app.services.image_index_service import perceptual_hash
+from app.services.image_quality import QualityReport, assess_image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_BYTES = metrics.counter(
+    "ai_doctor_image_bytes_total",
+    "Image bytes before and after preprocessing",
+    ("stage",)
+)
+IMAGE_REJECTIONS = metrics.counter(
+    "ai_doctor_image_rejections_total",
+    "Uploads rejected by the local quality check before any model call",
+    ("reason",)
+)
+
+# Formats the vision model accepts as-is; anything else is re-encoded as JPEG
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp"
+}
+
+EXIF_ORIENTATION = 0x0112
+
+class PreparedImage(NamedTuple):
+    """Image payload ready to be sent to the vision model"""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_size: int
+    phash: int = 0  # perceptual hash for near-duplicate lookups; 0 when disabled
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - len(self.data)
+
+def prepare_image(
+    data: bytes,
+    max_edge: int,
+    jpeg_quality: int,
+    webp_quality: int,
+    with_hash: bool = False
+) -> PreparedImage:
+    """Decode, orient, downscale and re-encode an image (runs in a worker process)"""
+    from PIL import Image, ImageOps
+    
+    with Image.open(BytesIO(data)) as image:
+        source_format = image.format
+        oriented = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        image = ImageOps.exif_transpose(image)
+        resized = max(image.size) > max_edge
+        if resized:
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        phash = perceptual_hash(image) if with_hash else 0
+
+        target_format = source_format if source_format in MIME_TYPES else "JPEG"
+        output = BytesIO()
+        if target_format == "JPEG":
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.save(output, "JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+        elif target_format == "WEBP":
+            image.save(output, "WEBP", quality=webp_quality, method=4)
+        else:
+            image.save(output, "PNG", optimize=True)
+        encoded = output.getvalue()
+        width, height = image.size
+
+    # Keep the original when re-encoding only made it bigger
+    if not resized and not oriented and target_format == source_format and len(encoded) >= len(data):
+        encoded = data
+
+    return PreparedImage(
+        data=encoded,
+        mime_type=MIME_TYPES[target_format],
+        width=width,
+        height=height,
+        original_size=len(data),
+        phash=phash
+    )
+
+class ImageService:
+    """Service for CPU-bound image preprocessing off the event loop"""
+
+    def __init__(self):
+        self._executor: Optional[Executor] = None
+        self.images_processed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.images_screened = 0
+        self.rejections: Dict[str, int] = {}
+
+    def _get_executor(self) -> Optional[Executor]:
+        """Create the worker pool on first use"""
+        if self._executor is None and settings.image_preprocess_workers > 0:
+            # Spawn rather than fork, so no worker holds the server's listening socket
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.image_preprocess_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def prepare(self, image_data: Union[bytes, memoryview]) -> PreparedImage:
+        """Preprocess an image in the worker pool"""
+        try:
+            loop = asyncio.get_running_loop()
+            prepared = await loop.run_in_executor(
+                self._get_executor(),
+                prepare_image,
+                bytes(image_data),
+                settings.image_max_edge,
+                settings.image_jpeg_quality,
+                settings.image_webp_quality,
+                settings.near_duplicate_enabled
+            )
+        except Exception as e:
+            logger.error(f"Image preprocessing failed: {str(e)}")
+            raise FileProcessingError(
+                "Could not read the image. Please upload a valid JPEG, PNG or WebP file."
+            )
+
+        self.images_processed += 1
+        self.bytes_in += prepared.original_size
+        self.bytes_out += len(prepared.data)
+        IMAGE_BYTES.inc(prepared.original_size, stage="original")
+        IMAGE_BYTES.inc(len(prepared.data), stage="prepared")
+        logger.info(
+            f"Image prepared: {prepared.original_size} -> {len(prepared.data)} bytes "
+            f"({prepared.width}x{prepared.height} {prepared.mime_type}, "
+            f"saved {prepared.bytes_saved} bytes)"
+        )
+        return prepared
+
+    async def screen(self, image_data: Union[bytes, memoryview]) -> Optional[QualityReport]:
+        """Reject images the vision model could not assess, with a message saying what to fix"""
+        try:
+            loop = asyncio.get_running_loop()
+            with track_stage("image_screen"):
+                report = await loop.run_in_executor(
+                    self._get_executor(),
+                    assess_image,
+                    bytes(image_data),
+                    settings.image_min_edge,
+                    settings.image_min_sharpness,
+                    settings.image_max_clipped,
+                    settings.image_min_skin_ratio
+                )
+        except Exception as e:
+            # The check only saves model calls, so a failing pool must not block analysis
+            logger.warning(f"Image quality check skipped: {str(e)}")
+            return None
+
+        self.images_screened += 1
+        if not report.accepted:
+            self.rejections[report.reason] = self.rejections.get(report.reason, 0) + 1
+            IMAGE_REJECTIONS.inc(reason=report.reason)
+            logger.info(f"Image rejected ({report.reason}): {report._asdict()}")
+            raise ImageQualityError(report.message(settings.image_min_edge), report._asdict())
+        return report
+
+    def stats(self) -> dict:
+        """Preprocessing and quality check counters"""
+        return {
+            "images_processed": self.images_processed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "images_screened": self.images_screened,
+            "rejections": dict(self.rejections)
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker pool and wait for its processes to exit (blocking)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+# Global image service instance, built on first use
+get_image_service = LazyService(ImageService)
@@ -0,0 +1,147 @@
+"""
+Periodic cleanup of the upload directory
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JANITOR_FILES = metrics.counter(
+    "ai_doctor_janitor_reclaimed_files_total",
+    "Files removed by the disk janitor",
+    ("directory", "reason")
+)
+JANITOR_BYTES = metrics.counter(
+    "ai_doctor_janitor_reclaimed_bytes_total",
+    "Bytes reclaimed by the disk janitor",
+    ("directory", "reason")
+)
+DIRECTORY_BYTES = metrics.gauge(
+    "ai_doctor_directory_bytes",
+    "Bytes held in a managed directory after the last sweep",
+    ("directory",)
+)
+
+# Files this fresh may still be in use, so the size quota never removes them
+MIN_AGE_SECONDS = 60
+
+class DirectoryQuota(NamedTuple):
+    """Retention limits for one directory"""
+    path: str
+    max_age: float
+    max_bytes: int
+
+class JanitorService:
+    """Service that keeps managed directories within their age and size quotas"""
+
+    def __init__(self):
+        self.quotas: List[DirectoryQuota] = []
+        self.sweeps = 0
+        self.files_reclaimed = 0
+        self.bytes_reclaimed = 0
+        self.last_sweep: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def manage(self, path: str, max_age: float, max_bytes: int) -> None:
+        """Add a directory to the sweep, replacing any earlier quota for it"""
+        self.quotas = [quota for quota in self.quotas if quota.path != path]
+        self.quotas.append(DirectoryQuota(path, max_age, max_bytes))
+
+    def sweep_directory(self, quota: DirectoryQuota) -> Tuple[int, int]:
+        """Remove expired files, then the oldest until under the size quota"""
+        now = time.time()
+        files = []
+        try:
+            with os.scandir(quota.path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                    except OSError:
+                        continue
+        except FileNotFoundError:
+            return 0, 0
+
+        removed_files = 0
+        removed_bytes = 0
+        total = sum(size for _, size, _ in files)
+        files.sort()
+        for modified, size, path in files:
+            age = now - modified
+            if age > quota.max_age:
+                reason = "age"
+            elif total > quota.max_bytes and age > MIN_AGE_SECONDS:
+                reason = "size"
+            else:
+                # Sorted oldest first, so every later file is newer still
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to remove {path}: {str(e)}")
+                continue
+            total -= size
+            removed_files += 1
+            removed_bytes += size
+            JANITOR_FILES.inc(directory=quota.path, reason=reason)
+            JANITOR_BYTES.inc(size, directory=quota.path, reason=reason)
+
+        DIRECTORY_BYTES.set(total, directory=quota.path)
+        return removed_files, removed_bytes
+
+    def sweep(self) -> Tuple[int, int]:
+        """Sweep every managed directory once"""
+        removed_files = 0
+        removed_bytes = 0
+        for quota in self.quotas:
+            files, size = self.sweep_directory(quota)
+            removed_files += files
+            removed_bytes += size
+        self.sweeps += 1
+        self.files_reclaimed += removed_files
+        self.bytes_reclaimed += removed_bytes
+        self.last_sweep = time.time()
+        if removed_files:
+            logger.info(f"Janitor reclaimed {removed_files} files ({removed_bytes} bytes)")
+        return removed_files, removed_bytes
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.warning(f"Janitor sweep failed: {str(e)}")
+            await asyncio.sleep(settings.janitor_interval)
+
+    async def start(self) -> None:
+        """Start sweeping in the background; the first sweep runs immediately"""
+        if self._task is None and settings.janitor_enabled:
+            self._task = asyncio.create_task(self._run(), name="janitor")
+
+    async def stop(self) -> None:
+        """Stop the background sweeps"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Sweep counters and the managed directories"""
+        return {
+            "sweeps": self.sweeps,
+            "files_reclaimed": self.files_reclaimed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_sweep": self.last_sweep,
+            "directories": [quota._asdict() for quota in self.quotas]
+        }
+
+# Global janitor service instance
+janitor_service = JanitorService()
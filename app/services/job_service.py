@@ -0,0 +1,350 @@
+"""
+Background job queue for analysis and transcription requests
+"""
+import asyncio
+import ipaddress
+import itertools
+import logging
+import socket
+import time
+import uuid
+import orjson
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+from fastapi.encoders import jsonable_encoder
+from app.core.cache import DiskCache
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError, ServiceUnavailableError
+from app.core.metrics import metrics
+from app.core.resilience import is_retryable
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS = metrics.counter(
+    "ai_doctor_job_events_total",
+    "Background job lifecycle events",
+    ("kind", "event")
+)
+JOBS_QUEUED = metrics.gauge(
+    "ai_doctor_jobs_queued",
+    "Background jobs waiting for a worker"
+)
+
+JobHandler = Callable[[], Awaitable[Dict[str, Any]]]
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed job may succeed later: saturation, throttling or a provider hiccup"""
+    if isinstance(error, ServiceUnavailableError) or is_retryable(error):
+        return True
+    # Services wrap provider errors in ModelError; the original is the context
+    cause = error.__cause__ or error.__context__
+    return cause is not None and is_retryable(cause)
+
+async def validate_webhook_url(url: str) -> None:
+    """Raise ValueError unless the URL is http(s) and points at an allowed or public host"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    
+    allowed_hosts = [allowed.lower() for allowed in settings.webhook_allowed_hosts]
+    if allowed_hosts:
+        if not any(host == allowed or host.endswith(f".{allowed}") for allowed in allowed_hosts):
+            raise ValueError(f"webhook_url host '{host}' is not allowed")
+        return
+    
+    # Without an allowlist, every address the host resolves to must be public
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+    except (OSError, ValueError):
+        raise ValueError(f"webhook_url host '{host}' could not be resolved")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise ValueError("webhook_url must point to a public address")
+
+class Job:
+    """A queued unit of work and its current state"""
+
+    def __init__(
+        self,
+        kind: str,
+        handler: JobHandler,
+        priority: int,
+        webhook_url: Optional[str]
+    ):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.webhook_url = webhook_url
+        self.status = "queued"
+        self.attempts = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.expires_at: Optional[float] = None
+        self.handler: Optional[JobHandler] = handler
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class JobService:
+    """In-process priority queue drained by a pool of async workers"""
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        # Job states by job ID; the SQLite store lets any worker answer a poll for
+        # a job another worker accepted, and outlives recycled workers
+        self.store: Optional[DiskCache] = None
+        if settings.job_store_path:
+            try:
+                self.store = DiskCache(
+                    settings.job_store_path,
+                    max_bytes=settings.job_store_max_bytes,
+                    ttl=settings.job_result_ttl
+                )
+            except Exception as e:
+                logger.warning(f"Shared job store disabled: {str(e)}")
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running = 0
+        self._draining = False
+        self._sequence = itertools.count()
+        self._notifications: Set[asyncio.Task] = set()
+        metrics.add_collector(self._collect)
+
+    def _collect(self) -> None:
+        JOBS_QUEUED.set(self._queue.qsize() if self._queue else 0)
+
+    async def start(self) -> None:
+        """Start the worker pool on the running event loop"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._draining = False
+        self._workers = [
+            asyncio.create_task(self._worker(index), name=f"job-worker-{index}")
+            for index in range(settings.job_workers)
+        ]
+        logger.info(f"Started {len(self._workers)} job workers")
+
+    async def stop(self, drain_timeout: float = 0.0) -> None:
+        """Let running jobs and webhooks finish for up to drain_timeout, then cancel the workers
+
+        Jobs still queued, or cut off by the drain timeout, are recorded as failed.
+        """
+        self._draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + drain_timeout
+        while self._running and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        if self._running:
+            logger.warning(f"Cancelling {self._running} running job(s) after {drain_timeout:.1f}s drain")
+        if self._notifications:
+            await asyncio.wait(set(self._notifications), timeout=max(0.0, deadline - loop.time()))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+        # The queue dies with this process, so tell pollers to resubmit instead of waiting forever
+        unfinished = [job for job in self.jobs.values() if job.finished_at is None]
+        for job in unfinished:
+            job.status = "failed"
+            job.error = "The server restarted before the job finished, please resubmit"
+            job.finished_at = datetime.now()
+            job.handler = None
+            JOB_EVENTS.inc(kind=job.kind, event="dropped")
+        if unfinished:
+            logger.warning(f"Dropped {len(unfinished)} unfinished job(s) on shutdown")
+            await asyncio.gather(*(self._save(job) for job in unfinished))
+
+    async def submit(
+        self,
+        kind: str,
+        handler: JobHandler,
+        priority: int = 5,
+        webhook_url: Optional[str] = None
+    ) -> Job:
+        """Queue a job and return it immediately"""
+        await self.start()
+        self._prune()
+
+        if self._queue.qsize() >= settings.job_max_pending:
+            JOB_EVENTS.inc(kind=kind, event="rejected")
+            raise ServiceUnavailableError(
+                "The job queue is full, please retry shortly",
+                {"queued": self._queue.qsize()}
+            )
+
+        job = Job(kind, handler, priority, webhook_url)
+        self.jobs[job.id] = job
+        await self._save(job)
+        self._enqueue(job)
+        JOB_EVENTS.inc(kind=kind, event="submitted")
+        return job
+
+    async def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job accepted by this or any other worker"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is None:
+            return None
+        try:
+            payload = await asyncio.to_thread(self.store.get, job_id)
+        except Exception as e:
+            logger.warning(f"Shared job store read failed: {str(e)}")
+            return None
+        return orjson.loads(payload) if payload is not None else None
+
+    async def _save(self, job: Job) -> None:
+        """Publish a job's state to the shared store"""
+        if self.store is None:
+            return
+        try:
+            payload = orjson.dumps(jsonable_encoder(job.to_dict()))
+            await asyncio.to_thread(self.store.set, job.id, payload)
+        except Exception as e:
+            logger.warning(f"Shared job store write failed: {str(e)}")
+
+    def _enqueue(self, job: Job) -> None:
+        # Lower priority values run first; the sequence keeps FIFO order within a priority
+        self._queue.put_nowait((job.priority, next(self._sequence), job.id))
+
+    def _prune(self) -> None:
+        """Forget finished jobs whose results have expired"""
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.expires_at is not None and job.expires_at <= now
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            # Nothing new starts while shutting down
+            if self._draining:
+                job = None
+            self._running += job is not None
+            try:
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} failed on {job_id}: {str(e)}")
+            finally:
+                self._running -= job is not None
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        """Run one attempt of a job, scheduling a retry on transient failures"""
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = job.started_at or datetime.now()
+        await self._save(job)
+
+        try:
+            job.result = await job.handler()
+        except FileProcessingError as e:
+            # Bad input will not get better on retry
+            self._finish(job, "failed", e.message)
+        except Exception as e:
+            message = e.message if isinstance(e, ServiceUnavailableError) else str(e)
+            # Model calls already retried transient errors; only those are worth another attempt
+            if job.attempts < settings.job_max_attempts and is_transient(e):
+                delay = settings.job_retry_backoff * 2 ** (job.attempts - 1)
+                if isinstance(e, ServiceUnavailableError):
+                    # Throttled or saturated: wait at least as long as we were told to
+                    delay = max(delay, float(e.details.get("retry_after", 0)))
+                logger.warning(
+                    f"Job {job.id} attempt {job.attempts} failed, retrying in {delay:.1f}s: {message}"
+                )
+                job.status = "retrying"
+                job.error = message
+                JOB_EVENTS.inc(kind=job.kind, event="retried")
+                asyncio.get_running_loop().call_later(delay, self._requeue, job)
+            else:
+                self._finish(job, "failed", message)
+        else:
+            self._finish(job, "completed", None)
+        await self._save(job)
+
+    def _requeue(self, job: Job) -> None:
+        if self._queue is not None and job.id in self.jobs:
+            job.status = "queued"
+            self._enqueue(job)
+
+    def _finish(self, job: Job, status: str, error: Optional[str]) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now()
+        job.expires_at = time.monotonic() + settings.job_result_ttl
+        # Drop the handler so the upload it captured can be freed
+        job.handler = None
+        JOB_EVENTS.inc(kind=job.kind, event=status)
+        logger.info(f"Job {job.id} {status} after {job.attempts} attempt(s)")
+        if job.webhook_url:
+            task = asyncio.create_task(self._notify(job))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    async def _notify(self, job: Job) -> None:
+        """POST the final job state to the client's webhook"""
+        import httpx
+        
+        payload = jsonable_encoder(job.to_dict())
+        try:
+            # Checked again at send time, in case the host now resolves elsewhere
+            await validate_webhook_url(job.webhook_url)
+        except ValueError as e:
+            JOB_EVENTS.inc(kind=job.kind, event="webhook_blocked")
+            logger.warning(f"Webhook for job {job.id} blocked: {str(e)}")
+            return
+        try:
+            async with httpx.AsyncClient(timeout=settings.job_webhook_timeout) as client:
+                response = await client.post(job.webhook_url, json=payload)
+                response.raise_for_status()
+            JOB_EVENTS.inc(kind=job.kind, event="webhook_sent")
+        except Exception as e:
+            JOB_EVENTS.inc(kind=job.kind, event="webhook_failed")
+            logger.warning(f"Webhook for job {job.id} failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and job counts by status"""
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": len(self._workers),
+            "running": self._running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "jobs": counts
+        }
+
+# Global job service instance
+job_service = JobService()
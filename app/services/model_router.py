@@ -0,0 +1,193 @@
+"""
+Per-request model selection with latency-aware routing and fallback
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError, ModelUnavailableError, ServiceUnavailableError
+from app.core.metrics import metrics
+from app.core.resilience import CircuitBreaker, call_policies, is_retryable
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MODEL_ROUTED = metrics.counter(
+    "ai_doctor_model_routed_total",
+    "Model calls by the model that served them and why it was chosen",
+    ("kind", "model", "reason")
+)
+MODEL_FALLBACKS = metrics.counter(
+    "ai_doctor_model_fallbacks_total",
+    "Calls that moved on to the next model after a failure",
+    ("kind", "model", "reason")
+)
+
+# Payloads above this many bytes are tracked separately; big images and long recordings are slower
+LARGE_PAYLOAD_BYTES = 512 * 1024
+
+def _size_class(payload_size: int) -> str:
+    return "large" if payload_size >= LARGE_PAYLOAD_BYTES else "small"
+
+class ModelRoute:
+    """One candidate model with its budget and observed behaviour"""
+
+    def __init__(self, model: str, latency_budget: float, cost: float):
+        self.model = model
+        self.latency_budget = latency_budget
+        self.cost = cost
+        self.latency: Dict[str, float] = {}  # EWMA seconds per payload size class
+        self.error_rate = 0.0  # EWMA of failures
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return call_policies.get(self.model).breaker
+
+    def expected_latency(self, payload_size: int) -> Optional[float]:
+        size_class = _size_class(payload_size)
+        return self.latency.get(size_class, self.latency.get("small"))
+
+    def within_budget(self, payload_size: int) -> bool:
+        expected = self.expected_latency(payload_size)
+        return (
+            (expected is None or expected <= self.latency_budget)
+            and self.error_rate <= settings.router_max_error_rate
+        )
+
+    def available(self) -> bool:
+        """False while the circuit is open and still cooling down"""
+        breaker = self.breaker
+        if breaker.state != CircuitBreaker.OPEN:
+            return True
+        return time.monotonic() - breaker.opened_at >= breaker.reset_timeout
+
+    def score(self, payload_size: int) -> float:
+        """Lower is better, used when no model is within budget"""
+        expected = self.expected_latency(payload_size) or self.latency_budget
+        return expected * (1 + 4 * self.error_rate) * self.cost
+
+    def record(self, payload_size: int, latency: Optional[float], failed: bool) -> None:
+        alpha = settings.router_ewma_alpha
+        self.requests += 1
+        self.failures += failed
+        self.error_rate += alpha * (float(failed) - self.error_rate)
+        if latency is not None:
+            size_class = _size_class(payload_size)
+            previous = self.latency.get(size_class)
+            self.latency[size_class] = latency if previous is None else previous + alpha * (latency - previous)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "latency_budget": self.latency_budget,
+            "cost": self.cost,
+            "ewma_latency": {size: round(value, 3) for size, value in self.latency.items()},
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit": self.breaker.state
+        }
+
+class ModelRouter:
+    """Ordered list of models for one task, preferring the first that is healthy and fast enough"""
+
+    def __init__(self, kind: str, models: Sequence[str], latency_budget: float):
+        self.kind = kind
+        self.routes: List[ModelRoute] = []
+        for model in dict.fromkeys(models):
+            self.routes.append(ModelRoute(
+                model,
+                latency_budget=settings.model_latency_budgets.get(model, latency_budget),
+                cost=settings.model_costs.get(model, 1.0)
+            ))
+
+    @property
+    def primary(self) -> str:
+        return self.routes[0].model
+
+    def candidates(self, payload_size: int) -> List[ModelRoute]:
+        """Models to try for a request, best first"""
+        available = [route for route in self.routes if route.available()] or list(self.routes)
+        preferred = [route for route in available if route.within_budget(payload_size)]
+        if preferred:
+            others = [route for route in available if route not in preferred]
+            return preferred + sorted(others, key=lambda route: route.score(payload_size))
+        return sorted(available, key=lambda route: route.score(payload_size))
+
+    async def call(
+        self,
+        payload_size: int,
+        operation: Callable[[str], Awaitable[T]],
+        hedge: bool = True,
+        observe_latency: bool = True
+    ) -> T:
+        """Run operation(model) on the chosen model, falling back down the list on failure"""
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + settings.model_call_deadline
+        candidates = self.candidates(payload_size)
+
+        for position, route in enumerate(candidates):
+            final = position == len(candidates) - 1
+            remaining = max(1.0, expires - loop.time())
+            # Leave time for the next model instead of spending the whole deadline here
+            deadline = remaining if final else min(remaining, route.latency_budget * settings.router_fallback_factor)
+            started = time.perf_counter()
+            try:
+                result = await call_policies.get(route.model).call(
+                    lambda model=route.model: operation(model),
+                    hedge=hedge,
+                    deadline=deadline
+                )
+            except FileProcessingError:
+                raise
+            except Exception as e:
+                route.record(payload_size, None, failed=True)
+                if isinstance(e, ServiceUnavailableError):
+                    if final:
+                        raise
+                elif not is_retryable(e):
+                    raise
+                elif final:
+                    # Transient upstream failures are a 503 to retry later, not a server error
+                    raise ModelUnavailableError(
+                        f"The {self.kind} model is temporarily unavailable, please retry",
+                        {"model": route.model, "reason": type(e).__name__}
+                    ) from e
+                reason = type(e).__name__
+                MODEL_FALLBACKS.inc(kind=self.kind, model=route.model, reason=reason)
+                logger.warning(
+                    f"{self.kind} model {route.model} failed ({reason}), "
+                    f"falling back to {candidates[position + 1].model}"
+                )
+                continue
+
+            latency = time.perf_counter() - started if observe_latency else None
+            route.record(payload_size, latency, failed=False)
+            if position > 0:
+                reason = "fallback"
+            elif route is not self.routes[0]:
+                reason = "rerouted"
+            else:
+                reason = "primary"
+            MODEL_ROUTED.inc(kind=self.kind, model=route.model, reason=reason)
+            return result
+
+        raise ServiceUnavailableError(f"No {self.kind} model is available")
+
+    def stats(self) -> Dict[str, Any]:
+        return {route.model: route.stats() for route in self.routes}
+
+# Global model routers
+vision_router = ModelRouter(
+    "vision",
+    [settings.vision_model, *settings.vision_fallback_models],
+    latency_budget=settings.vision_latency_budget
+)
+stt_router = ModelRouter(
+    "stt",
+    [settings.stt_model, *settings.stt_fallback_models],
+    latency_budget=settings.stt_latency_budget
+)
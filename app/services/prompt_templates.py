@@ -0,0 +1,144 @@
+"""
+Versioned prompt templates for image analysis, one family per specialty
+"""
+import binascii
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence, Union
+from app.core.config import settings
+from app.core.metrics import metrics
+
+PROMPT_REQUESTS = metrics.counter(
+    "ai_doctor_prompt_template_requests_total",
+    "Vision requests by prompt template and version",
+    ("specialty", "version")
+)
+
+# Raw bytes per base64 chunk; a multiple of 3 so chunks encode without padding
+ENCODE_CHUNK_BYTES = 3 * 64 * 1024
+
+# Appended to the prompt when several photos of one condition are sent together
+MULTI_VIEW_NOTE = (
+    "\n\nThe images are different photos of the same area or condition. "
+    "Consider them together and give a single assessment."
+)
+
+SYMPTOMS_PREFIX = "\n\nPatient's described symptoms: "
+
+RESPONSE_GUIDELINES = """- Suggest appropriate remedies or next steps
+- Always recommend consulting a healthcare professional for serious concerns
+- Keep responses concise but informative (2-3 sentences)
+- Use empathetic, patient-friendly language
+- Start responses with "Based on what I observe..." rather than "In the image I see"
+- Avoid markdown formatting in responses
+
+Remember: This is for educational purposes and should not replace professional medical advice."""
+
+def image_data_url(data: Union[bytes, memoryview], mime_type: str) -> str:
+    """Base64 data URL built in one preallocated buffer instead of several full-size copies"""
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    view = memoryview(data)
+    buffer = bytearray(len(prefix) + 4 * ((len(view) + 2) // 3))
+    buffer[:len(prefix)] = prefix
+    position = len(prefix)
+    for start in range(0, len(view), ENCODE_CHUNK_BYTES):
+        encoded = binascii.b2a_base64(view[start:start + ENCODE_CHUNK_BYTES], newline=False)
+        buffer[position:position + len(encoded)] = encoded
+        position += len(encoded)
+    return buffer.decode("ascii")
+
+class PromptTemplate:
+    """A versioned analysis prompt whose fixed text is assembled once"""
+
+    def __init__(self, specialty: str, version: int, instructions: str):
+        self.specialty = specialty
+        self.version = version
+        self.single_view = instructions
+        self.multi_view = instructions + MULTI_VIEW_NOTE
+        # Editing the text without bumping the version still changes cache keys
+        digest = hashlib.sha256(instructions.encode("utf-8")).hexdigest()[:12]
+        self.cache_id = f"{specialty}@v{version}:{digest}"
+
+    def text(self, symptoms: Optional[str], image_count: int = 1) -> str:
+        """Prompt text for a request"""
+        base = self.multi_view if image_count > 1 else self.single_view
+        return base + SYMPTOMS_PREFIX + symptoms if symptoms else base
+
+    def cache_tag(self, image_count: int = 1) -> str:
+        """Template identity folded into result cache keys"""
+        return self.cache_id + "+multi" if image_count > 1 else self.cache_id
+
+    def build_messages(
+        self,
+        images: Sequence[Any],
+        symptoms: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Chat messages for prepared images (anything with data and mime_type)"""
+        content: List[Dict[str, Any]] = [{"type": "text", "text": self.text(symptoms, len(images))}]
+        content.extend(
+            {"type": "image_url", "image_url": {"url": image_data_url(image.data, image.mime_type)}}
+            for image in images
+        )
+        return [{"role": "user", "content": content}]
+
+    def record_use(self) -> None:
+        PROMPT_REQUESTS.inc(specialty=self.specialty, version=str(self.version))
+
+class PromptRegistry:
+    """All template versions, with the newest (or a pinned) version served per specialty"""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[int, PromptTemplate]] = {}
+
+    def register(self, template: PromptTemplate) -> None:
+        self._templates.setdefault(template.specialty, {})[template.version] = template
+
+    @property
+    def specialties(self) -> List[str]:
+        return sorted(self._templates)
+
+    def get(self, specialty: Optional[str] = None) -> PromptTemplate:
+        """Template for a specialty; PROMPT_TEMPLATE_VERSIONS can pin an older version"""
+        specialty = specialty or settings.default_specialty
+        versions = self._templates.get(specialty)
+        if not versions:
+            raise ValueError(
+                f"Unknown specialty '{specialty}'. Available: {', '.join(self.specialties)}"
+            )
+        pinned = settings.prompt_template_versions.get(specialty)
+        if pinned is not None and int(pinned) in versions:
+            return versions[int(pinned)]
+        return versions[max(versions)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            specialty: {
+                "serving": self.get(specialty).cache_id,
+                "versions": sorted(versions)
+            }
+            for specialty, versions in self._templates.items()
+        }
+
+# Global prompt template registry
+prompt_templates = PromptRegistry()
+
+prompt_templates.register(PromptTemplate("general", 1, f"""You are a professional medical AI assistant. Analyze the provided image and symptoms to provide helpful medical insights.
+
+Guidelines:
+- Provide clear, professional medical observations
+{RESPONSE_GUIDELINES}"""))
+
+prompt_templates.register(PromptTemplate("dermatology", 1, f"""You are a professional dermatology AI assistant. Analyze the provided image of the skin and the symptoms to provide helpful insights.
+
+Guidelines:
+- Describe the lesion or rash: color, shape, borders, distribution and texture
+- Name the most likely skin conditions, most likely first
+- Flag warning signs such as irregular or changing moles, bleeding, or rapid spread, and advise prompt in-person review
+{RESPONSE_GUIDELINES}"""))
+
+prompt_templates.register(PromptTemplate("scalp", 1, f"""You are a professional AI assistant for hair and scalp conditions. Analyze the provided image of the scalp or hair and the symptoms to provide helpful insights.
+
+Guidelines:
+- Describe flaking, redness, scaling, hair density and any patches of hair loss
+- Distinguish common causes such as dandruff, seborrheic dermatitis, psoriasis, fungal infection and alopecia
+- Mention suitable over-the-counter treatments where appropriate
+{RESPONSE_GUIDELINES}"""))
@@ -0,0 +1,250 @@
+"""
+Incremental transcription of live recordings split into speech segments
+"""
+import asyncio
+import logging
+import wave
+from collections import deque
+from io import BytesIO
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.exceptions import AIDocterException
+from app.core.metrics import metrics
+from app.services.ai_service import get_ai_service
+
+logger = logging.getLogger(__name__)
+
+STREAM_SESSIONS = metrics.gauge(
+    "ai_doctor_stream_sessions",
+    "Open streaming transcription connections"
+)
+STREAM_SEGMENTS = metrics.counter(
+    "ai_doctor_stream_segments_total",
+    "Speech segments transcribed from live recordings",
+    ("outcome",)
+)
+
+FRAME_MS = 30
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+class SpeechSegmenter:
+    """Energy-based voice activity detection that cuts 16-bit mono PCM at pauses"""
+
+    def __init__(
+        self,
+        sample_rate: int,
+        threshold_dbfs: float,
+        silence_ms: int,
+        min_speech_ms: int,
+        max_segment_seconds: float,
+        padding_ms: int
+    ):
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * FRAME_MS // 1000 * SAMPLE_WIDTH
+        self.threshold_rms = 32768 * 10 ** (threshold_dbfs / 20)
+        self.silence_frames = max(1, silence_ms // FRAME_MS)
+        self.min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+        self.max_segment_bytes = int(max_segment_seconds * sample_rate) * SAMPLE_WIDTH
+        self.padding_frames = padding_ms // FRAME_MS
+        from pydub import AudioSegment
+        self._audio_segment = AudioSegment
+        self._pending = bytearray()
+        self._preroll: Deque[bytes] = deque(maxlen=self.padding_frames + 1)
+        self._speech = bytearray()
+        self._voiced = 0
+        self._silent = 0
+
+    def _is_voiced(self, frame: bytes) -> bool:
+        sound = self._audio_segment(data=frame, sample_width=SAMPLE_WIDTH, frame_rate=self.sample_rate, channels=1)
+        return sound.rms > self.threshold_rms
+
+    def feed(self, pcm: bytes) -> List[bytes]:
+        """Add audio and return any segments it completed"""
+        self._pending += pcm
+        segments = []
+        usable = len(self._pending) - len(self._pending) % self.frame_bytes
+        for offset in range(0, usable, self.frame_bytes):
+            segment = self._frame(bytes(self._pending[offset:offset + self.frame_bytes]))
+            if segment:
+                segments.append(segment)
+        del self._pending[:usable]
+        return segments
+
+    def _frame(self, frame: bytes) -> Optional[bytes]:
+        voiced = self._is_voiced(frame)
+        if not self._speech:
+            self._preroll.append(frame)
+            if voiced:
+                # Start the segment with a little audio from before the onset
+                self._speech = bytearray(b"".join(self._preroll))
+                self._preroll.clear()
+                self._voiced = 1
+                self._silent = 0
+            return None
+
+        self._speech += frame
+        if voiced:
+            self._voiced += 1
+            self._silent = 0
+        else:
+            self._silent += 1
+
+        if self._silent >= self.silence_frames:
+            # Keep only padding_ms of the trailing pause
+            trailing = (self._silent - self.padding_frames) * self.frame_bytes
+            return self._cut(len(self._speech) - max(0, trailing))
+        if len(self._speech) >= self.max_segment_bytes:
+            return self._cut(len(self._speech))
+        return None
+
+    def _cut(self, length: int) -> Optional[bytes]:
+        segment = bytes(self._speech[:length]) if self._voiced >= self.min_speech_frames else None
+        self._speech = bytearray()
+        self._voiced = 0
+        self._silent = 0
+        return segment
+
+    def flush(self) -> Optional[bytes]:
+        """Return the speech still buffered when the recording ends"""
+        self._pending.clear()
+        self._preroll.clear()
+        if not self._speech:
+            return None
+        trailing = max(0, self._silent - self.padding_frames) * self.frame_bytes
+        return self._cut(len(self._speech) - trailing)
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap raw 16-bit mono PCM in a WAV container"""
+    output = BytesIO()
+    with wave.open(output, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return output.getvalue()
+
+class TranscriptionSession:
+    """One live recording: segments are transcribed while the patient keeps speaking"""
+
+    def __init__(self, send: Callable[[dict], Awaitable[None]]):
+        self.sample_rate = settings.audio_sample_rate
+        self.segmenter = SpeechSegmenter(
+            self.sample_rate,
+            threshold_dbfs=settings.stream_vad_threshold,
+            silence_ms=settings.stream_silence_ms,
+            min_speech_ms=settings.stream_min_speech_ms,
+            max_segment_seconds=settings.stream_max_segment_seconds,
+            padding_ms=settings.audio_silence_padding_ms
+        )
+        self.speech_seconds = 0.0
+        self.truncated = False
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(settings.stream_max_concurrent_segments)
+        self._texts: Dict[int, str] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._segments = 0
+
+    @property
+    def accepting(self) -> bool:
+        """False once max_recording_duration of speech has been received"""
+        return not self.truncated
+
+    def feed(self, pcm: bytes) -> None:
+        """Buffer audio and start transcribing every segment it completes"""
+        if self.truncated:
+            return
+        for segment in self.segmenter.feed(pcm):
+            self._start(segment)
+
+    def _start(self, pcm: bytes) -> None:
+        duration = len(pcm) / (self.sample_rate * SAMPLE_WIDTH)
+        remaining = settings.max_recording_duration - self.speech_seconds
+        if duration > remaining:
+            self.truncated = True
+            pcm = pcm[:max(0, int(remaining * self.sample_rate)) * SAMPLE_WIDTH]
+            duration = remaining
+            if not pcm:
+                return
+        self.speech_seconds += duration
+        index = self._segments
+        self._segments += 1
+        task = asyncio.ensure_future(self._transcribe(index, pcm))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _transcribe(self, index: int, pcm: bytes) -> None:
+        async with self._semaphore:
+            try:
+                text = await get_ai_service().transcribe_audio(
+                    pcm_to_wav(pcm, self.sample_rate),
+                    f"segment-{index}.wav"
+                )
+            except AIDocterException as e:
+                STREAM_SEGMENTS.inc(outcome="error")
+                logger.error(f"Segment {index} transcription failed: {e.message}")
+                await self.send({"type": "error", "segment": index, "message": e.message})
+                return
+        STREAM_SEGMENTS.inc(outcome="ok")
+        self._texts[index] = text.strip()
+        await self.send({
+            "type": "partial",
+            "segment": index,
+            "text": self._texts[index],
+            "transcript": self.transcript()
+        })
+
+    def transcript(self) -> str:
+        """Text of the segments transcribed so far, in spoken order"""
+        return " ".join(self._texts[index] for index in sorted(self._texts) if self._texts[index])
+
+    async def send(self, message: dict) -> None:
+        """Send to the client, ignoring a connection that has already gone away"""
+        async with self._send_lock:
+            try:
+                await self._send(message)
+            except Exception as e:
+                logger.debug(f"Dropped stream message: {str(e)}")
+
+    async def finish(self) -> str:
+        """Transcribe the remaining audio and send the final transcript"""
+        tail = self.segmenter.flush()
+        if tail and not self.truncated:
+            self._start(tail)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        transcript = self.transcript()
+        await self.send({
+            "type": "final",
+            "transcript": transcript,
+            "segments": self._segments,
+            "speech_seconds": round(self.speech_seconds, 1),
+            "truncated": self.truncated
+        })
+        return transcript
+
+    def cancel(self) -> None:
+        """Stop transcriptions nobody is waiting for any more"""
+        for task in list(self._tasks):
+            task.cancel()
+
+class StreamTranscriptionService:
+    """Service for live transcription sessions"""
+
+    def __init__(self):
+        self.active_sessions = 0
+
+    def open_session(self, send: Callable[[dict], Awaitable[None]]) -> TranscriptionSession:
+        """Start a session whose messages go to send"""
+        self.active_sessions += 1
+        STREAM_SESSIONS.inc()
+        return TranscriptionSession(send)
+
+    def close_session(self, session: TranscriptionSession) -> None:
+        """Release a session and any transcriptions still running"""
+        session.cancel()
+        self.active_sessions -= 1
+        STREAM_SESSIONS.dec()
+
+# Global stream transcription service instance
+stream_transcription_service = StreamTranscriptionService()
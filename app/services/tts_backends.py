@@ -0,0 +1,117 @@
+"""
+Text-to-speech backends used by the audio service
+"""
+import shutil
+import logging
+import subprocess
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Dict, Type
+from app.core.config import settings
+from app.core.exceptions import AudioProcessingError
+
+logger = logging.getLogger(__name__)
+
+class TTSBackend(ABC):
+    """Interface every speech synthesis engine implements"""
+
+    # Short identifier used in settings and cache keys
+    name: str = ""
+    media_type: str = "audio/mpeg"
+    file_extension: str = "mp3"
+    # Whether independently synthesized chunks can be played back to back
+    concatenable: bool = True
+
+    @abstractmethod
+    def synthesize(self, text: str) -> bytes:
+        """Render text to encoded audio bytes"""
+
+    def cache_namespace(self) -> str:
+        """Settings that change the rendered audio, folded into cache keys"""
+        return self.name
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS; needs network access for every synthesis"""
+
+    name = "gtts"
+
+    def synthesize(self, text: str) -> bytes:
+        from gtts import gTTS
+        
+        tts = gTTS(
+            text=text,
+            lang=settings.tts_language,
+            slow=False,
+            tld=settings.tts_tld
+        )
+        buffer = BytesIO()
+        tts.write_to_fp(buffer)
+        return buffer.getvalue()
+
+    def cache_namespace(self) -> str:
+        return f"{self.name}:{settings.tts_language}:{settings.tts_tld}"
+
+class EspeakBackend(TTSBackend):
+    """Local offline synthesis through the espeak-ng (or espeak) command line"""
+
+    name = "espeak"
+    media_type = "audio/wav"
+    file_extension = "wav"
+    # Each WAV carries its own header, so chunks cannot simply be appended
+    concatenable = False
+
+    def __init__(self):
+        self._binary = None
+
+    def _find_binary(self) -> str:
+        """Locate the espeak executable on first use"""
+        if self._binary is None:
+            candidates = [settings.espeak_binary, "espeak-ng", "espeak"]
+            for candidate in candidates:
+                path = shutil.which(candidate) if candidate else None
+                if path:
+                    self._binary = path
+                    break
+            else:
+                raise AudioProcessingError(
+                    "espeak-ng is not installed; install it or set TTS_BACKEND=gtts"
+                )
+        return self._binary
+
+    def synthesize(self, text: str) -> bytes:
+        result = subprocess.run(
+            [
+                self._find_binary(),
+                "-v", settings.espeak_voice,
+                "-s", str(settings.espeak_rate),
+                "--stdout",
+                # Text on stdin, so input starting with "-" is never read as an option
+                "--stdin"
+            ],
+            input=text.encode("utf-8"),
+            capture_output=True,
+            timeout=30,
+            check=False
+        )
+        if result.returncode != 0 or not result.stdout:
+            raise AudioProcessingError(
+                f"espeak failed: {result.stderr.decode('utf-8', 'replace').strip()}"
+            )
+        return result.stdout
+
+    def cache_namespace(self) -> str:
+        return f"{self.name}:{settings.espeak_voice}:{settings.espeak_rate}"
+
+TTS_BACKENDS: Dict[str, Type[TTSBackend]] = {
+    GTTSBackend.name: GTTSBackend,
+    EspeakBackend.name: EspeakBackend
+}
+
+def create_tts_backend(name: str) -> TTSBackend:
+    """Instantiate a backend by its settings name"""
+    backend_class = TTS_BACKENDS.get(name.lower())
+    if backend_class is None:
+        raise AudioProcessingError(
+            f"Unknown TTS backend '{name}'. Available: {', '.join(TTS_BACKENDS)}"
+        )
+    return backend_class()
@@ -7,6 +7,8 @@ class AIDoctorApp {
         this.mediaRecorder = null;
         this.audioChunks = [];
         this.isRecording = false;
+        this.transcriptionSocket = null;
+        this.pcmCapture = null;
         
         this.init();
     }
@@ -176,21 +178,27 @@ class AIDoctorApp {
                 formData.append('symptoms', symptoms);
             }
             
-            const response = await fetch('/api/diagnosis/analyze', {
+            const response = await fetch('/api/diagnosis/analyze/stream', {
                 method: 'POST',
                 body: formData
             });
             
             if (!response.ok) {
+                // Unusable images come back as 422 with advice on retaking the photo
+                const error = await response.json().catch(() => null);
+                if (response.status === 422 && error?.detail?.message) {
+                    this.showAlert(error.detail.message, 'error');
+                    return;
+                }
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            const result = await response.json();
+            const result = await this.readDiagnosisStream(response);
             this.displayResults(result);
             
             // Generate audio response
             if (result.diagnosis) {
-                await this.generateAudioResponse(result.diagnosis);
+                await this.generateAudioResponse(result);
             }
             
         } catch (error) {
@@ -201,6 +209,81 @@ class AIDoctorApp {
         }
     }
     
+    async readDiagnosisStream(response) {
+        // Parse Server-Sent Events from the streaming analysis endpoint
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let result = null;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const { event, data } = this.parseServerEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                
+                if (event === 'token') {
+                    text += data.text;
+                    this.displayPartialDiagnosis(text);
+                } else if (event === 'result') {
+                    result = data;
+                } else if (event === 'error') {
+                    throw new Error(data.message);
+                }
+            }
+        }
+        
+        if (!result) {
+            throw new Error('Diagnosis stream ended unexpectedly');
+        }
+        return result;
+    }
+    
+    parseServerEvent(rawEvent) {
+        let event = 'message';
+        const dataLines = [];
+        
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
+            }
+        });
+        
+        return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+    }
+    
+    displayPartialDiagnosis(text) {
+        const resultsSection = document.getElementById('resultsSection');
+        if (!resultsSection) return;
+        
+        let partial = document.getElementById('partialDiagnosis');
+        if (!partial) {
+            document.getElementById('loadingIndicator')?.classList.add('hidden');
+            resultsSection.innerHTML = `
+                <div class="card diagnosis-result">
+                    <div class="card-header">
+                        <h3 class="text-xl font-bold text-blue-700">Analyzing...</h3>
+                    </div>
+                    <div class="card-body">
+                        <h4 class="font-semibold text-gray-700 mb-2">Diagnosis:</h4>
+                        <p id="partialDiagnosis" class="text-gray-800 leading-relaxed"></p>
+                    </div>
+                </div>
+            `;
+            resultsSection.classList.remove('hidden');
+            partial = document.getElementById('partialDiagnosis');
+        }
+        
+        partial.textContent = text;
+    }
+    
     displayResults(result) {
         const resultsSection = document.getElementById('resultsSection');
         if (!resultsSection) return;
@@ -231,7 +314,7 @@ class AIDoctorApp {
                     
                     <div class="mb-4">
                         <h4 class="font-semibold text-gray-700 mb-2">Recommended Actions:</h4>
-                        <p class="text-gray-800 leading-relaxed">${result.solution}</p>
+                        <p class="text-gray-800 leading-relaxed">${result.solution || result.diagnosis}</p>
                     </div>
                     
                     <div id="audioResponseSection" class="audio-controls hidden">
@@ -259,33 +342,87 @@ class AIDoctorApp {
         }
     }
     
-    async generateAudioResponse(text) {
+    async generateAudioResponse(result) {
         try {
-            const formData = new FormData();
-            formData.append('text', text);
-            
-            const response = await fetch('/api/diagnosis/audio-response', {
-                method: 'POST',
-                body: formData
-            });
+            // Stored results are spoken by ID, so the text is not uploaded again
+            let response = null;
+            if (result.result_id) {
+                response = await this.requestAudio('result_id', result.result_id);
+            }
+            // The stored result may have expired; the text always works
+            if (!response || response.status === 404) {
+                response = await this.requestAudio('text', result.diagnosis);
+            }
             
             if (response.ok) {
-                const audioBlob = await response.blob();
-                const audioUrl = URL.createObjectURL(audioBlob);
-                
                 const audioPlayer = document.getElementById('audioPlayer');
                 const audioSection = document.getElementById('audioResponseSection');
+                if (!audioPlayer || !audioSection) return;
                 
-                if (audioPlayer && audioSection) {
-                    audioPlayer.src = audioUrl;
-                    audioSection.classList.remove('hidden');
+                if (this.canStreamAudio(response)) {
+                    // Start playback as soon as the first sentence arrives
+                    audioPlayer.src = this.streamAudio(response);
+                } else {
+                    const audioBlob = await response.blob();
+                    audioPlayer.src = URL.createObjectURL(audioBlob);
                 }
+                audioSection.classList.remove('hidden');
             }
         } catch (error) {
             console.error('Audio generation failed:', error);
         }
     }
     
+    requestAudio(field, value) {
+        const formData = new FormData();
+        formData.append(field, value);
+        return fetch('/api/diagnosis/audio-response', {
+            method: 'POST',
+            body: formData
+        });
+    }
+    
+    canStreamAudio(response) {
+        // Only MP3 responses arrive as independently playable sentence chunks
+        const contentType = response.headers.get('content-type') || '';
+        return Boolean(
+            response.body &&
+            window.MediaSource &&
+            contentType.startsWith('audio/mpeg') &&
+            MediaSource.isTypeSupported('audio/mpeg')
+        );
+    }
+    
+    streamAudio(response) {
+        const mediaSource = new MediaSource();
+        
+        mediaSource.addEventListener('sourceopen', async () => {
+            const sourceBuffer = mediaSource.addSourceBuffer('audio/mpeg');
+            sourceBuffer.mode = 'sequence';
+            const reader = response.body.getReader();
+            
+            try {
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    
+                    sourceBuffer.appendBuffer(value);
+                    await new Promise(resolve => {
+                        sourceBuffer.addEventListener('updateend', resolve, { once: true });
+                    });
+                }
+                mediaSource.endOfStream();
+            } catch (error) {
+                console.error('Audio streaming failed:', error);
+                if (mediaSource.readyState === 'open') {
+                    mediaSource.endOfStream('network');
+                }
+            }
+        }, { once: true });
+        
+        return URL.createObjectURL(mediaSource);
+    }
+    
     playAudioResponse() {
         const audioPlayer = document.getElementById('audioPlayer');
         const playBtn = document.getElementById('playAudioBtn');
@@ -331,6 +468,7 @@ class AIDoctorApp {
             };
             
             this.mediaRecorder.start();
+            this.startLiveTranscription(stream);
             this.isRecording = true;
             this.updateRecordingUI(true);
             
@@ -350,11 +488,77 @@ class AIDoctorApp {
     stopRecording() {
         if (this.mediaRecorder && this.isRecording) {
             this.mediaRecorder.stop();
+            this.stopLiveTranscription();
             this.isRecording = false;
             this.updateRecordingUI(false);
         }
     }
     
+    startLiveTranscription(stream) {
+        // Send raw PCM while recording; the server transcribes each phrase after a pause
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/api/diagnosis/transcribe/stream`);
+        const symptomsField = document.getElementById('symptoms');
+        const typedSymptoms = symptomsField?.value.trim() || '';
+        
+        socket.onmessage = (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'ready') {
+                this.startPcmCapture(stream, socket, message.sample_rate);
+            } else if ((message.type === 'partial' || message.type === 'final') && symptomsField) {
+                symptomsField.value = [typedSymptoms, message.transcript].filter(Boolean).join(' ');
+            } else if (message.type === 'error') {
+                console.warn('Live transcription:', message.message);
+            }
+        };
+        socket.onerror = () => console.warn('Live transcription unavailable');
+        
+        this.transcriptionSocket = socket;
+    }
+    
+    startPcmCapture(stream, socket, targetRate) {
+        const context = new (window.AudioContext || window.webkitAudioContext)();
+        const source = context.createMediaStreamSource(stream);
+        const processor = context.createScriptProcessor(4096, 1, 1);
+        const ratio = context.sampleRate / targetRate;
+        
+        processor.onaudioprocess = (event) => {
+            if (socket.readyState !== WebSocket.OPEN) return;
+            
+            // Downsample to the server rate and convert to 16-bit little-endian PCM
+            const input = event.inputBuffer.getChannelData(0);
+            const output = new Int16Array(Math.floor(input.length / ratio));
+            for (let i = 0; i < output.length; i++) {
+                const sample = Math.max(-1, Math.min(1, input[Math.floor(i * ratio)]));
+                output[i] = sample < 0 ? sample * 0x8000 : sample * 0x7fff;
+            }
+            socket.send(output.buffer);
+        };
+        
+        source.connect(processor);
+        processor.connect(context.destination);
+        this.pcmCapture = { context, source, processor };
+    }
+    
+    stopLiveTranscription() {
+        if (this.pcmCapture) {
+            const { context, source, processor } = this.pcmCapture;
+            source.disconnect();
+            processor.disconnect();
+            context.close();
+            this.pcmCapture = null;
+        }
+        
+        const socket = this.transcriptionSocket;
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            // The server answers with the final transcript and closes the socket
+            socket.send(JSON.stringify({ type: 'stop' }));
+        } else if (socket) {
+            socket.close();
+        }
+        this.transcriptionSocket = null;
+    }
+    
     updateRecordingUI(recording) {
         const recordBtn = document.getElementById('recordBtn');
         const stopBtn = document.getElementById('stopBtn');
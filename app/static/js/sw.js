@@ -1,5 +1,5 @@
 // Service Worker for AI Doctor PWA
-const CACHE_NAME = 'ai-doctor-v1';
+const CACHE_NAME = 'ai-doctor-v2';
 const urlsToCache = [
     '/',
     '/static/css/styles.css',
@@ -14,6 +14,15 @@ self.addEventListener('install', (event) => {
     );
 });
 
+self.addEventListener('activate', (event) => {
+    // Drop caches from previous versions so updated assets are served
+    event.waitUntil(
+        caches.keys().then((names) => Promise.all(
+            names.filter((name) => name !== CACHE_NAME).map((name) => caches.delete(name))
+        ))
+    );
+});
+
 self.addEventListener('fetch', (event) => {
     event.respondWith(
         caches.match(event.request)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Groq and Google TTS APIs with configurable latency and errors
+
+Usage:
+    python -m benchmarks.fake_upstream --port 8900 --latency-ms 800 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+SAMPLE_DIAGNOSIS = (
+    "Based on what I observe, this looks like mild inflammatory acne with a few "
+    "red papules. Wash twice daily with a gentle cleanser and try a benzoyl "
+    "peroxide gel. Please see a dermatologist if it becomes painful or scars."
+)
+SAMPLE_TRANSCRIPT = "I have had an itchy red rash on my arm for about three days."
+
+class UpstreamProfile:
+    """Latency and error distribution shared by every fake endpoint"""
+
+    def __init__(
+        self,
+        latency_ms: float,
+        latency_sigma: float,
+        error_rate: float,
+        rate_limit_rate: float,
+        token_delay_ms: float
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_delay_ms = token_delay_ms
+
+    @classmethod
+    def from_env(cls) -> "UpstreamProfile":
+        return cls(
+            latency_ms=float(os.getenv("FAKE_LATENCY_MS", "500")),
+            latency_sigma=float(os.getenv("FAKE_LATENCY_SIGMA", "0.3")),
+            error_rate=float(os.getenv("FAKE_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_RATE_LIMIT_RATE", "0")),
+            token_delay_ms=float(os.getenv("FAKE_TOKEN_DELAY_MS", "15"))
+        )
+
+    def latency(self, scale: float = 1.0) -> float:
+        """Log-normal latency in seconds around the configured median"""
+        if self.latency_ms <= 0:
+            return 0.0
+        return scale * self.latency_ms / 1000 * random.lognormvariate(0, self.latency_sigma)
+
+    def failure(self) -> Optional[JSONResponse]:
+        """Randomly return a rate-limit or server error response"""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "1"}
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse(
+                {"error": {"message": "Internal server error", "type": "internal_server_error"}},
+                status_code=500
+            )
+        return None
+
+def create_app(profile: UpstreamProfile) -> FastAPI:
+    """Build the fake upstream application"""
+    app = FastAPI(title="Fake Groq/gTTS upstream")
+    # A short MP3 payload for the fake TTS responses
+    mp3_path = os.path.join(os.path.dirname(__file__), os.pardir, "gtts_testing.mp3")
+    try:
+        with open(mp3_path, "rb") as f:
+            mp3_bytes = f.read(4096)
+    except OSError:
+        mp3_bytes = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+    @app.get("/openai/v1/models")
+    async def list_models():
+        return {"object": "list", "data": []}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake-model")
+        failure = profile.failure()
+        await asyncio.sleep(profile.latency())
+        if failure is not None:
+            return failure
+
+        created = int(time.time())
+        if not body.get("stream"):
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": SAMPLE_DIAGNOSIS},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 1200, "completion_tokens": 60, "total_tokens": 1260}
+            }
+
+        async def events():
+            for word in SAMPLE_DIAGNOSIS.split(" "):
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(profile.token_delay_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/openai/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        await request.body()
+        failure = profile.failure()
+        await asyncio.sleep(profile.latency(scale=0.5))
+        if failure is not None:
+            return failure
+        return {"text": SAMPLE_TRANSCRIPT}
+
+    @app.post("/_/TranslateWebserverUi/data/batchexecute")
+    async def google_tts(request: Request):
+        await request.body()
+        await asyncio.sleep(profile.latency(scale=0.4))
+        if profile.failure() is not None:
+            return PlainTextResponse("error", status_code=500)
+        encoded = base64.b64encode(mp3_bytes).decode("ascii")
+        # Same envelope gTTS parses from the real batchexecute endpoint
+        line = '[["wrb.fr","jQ1olc","[\\"' + encoded + '\\"]",null,null,null,"generic"]]'
+        return PlainTextResponse(")]}'\n\n" + line + "\n")
+
+    return app
+
+# Module-level app for `uvicorn benchmarks.fake_upstream:app`, configured from FAKE_* variables
+app = create_app(UpstreamProfile.from_env())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Groq/gTTS upstream for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=500, help="median model latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="log-normal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--token-delay-ms", type=float, default=15, help="delay between streamed tokens")
+    args = parser.parse_args()
+
+    profile = UpstreamProfile(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        token_delay_ms=args.token_delay_ms
+    )
+    uvicorn.run(create_app(profile), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Check how long importing the application takes and which modules it pulls in
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, prints the
+slowest imports by cumulative time and fails if the total exceeds a budget or
+a module that should only load on first use (Groq SDK, gTTS, Pillow, pydub,
+httpx, NumPy) was imported eagerly.
+
+Usage:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms 800 --top 30
+    python -m benchmarks.importtime --module app.api.diagnosis
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Loaded lazily by the services; seeing them at import time is a regression
+DEFERRED_MODULES = ["groq", "gtts", "PIL", "pydub", "httpx", "numpy"]
+
+def profile_import(module: str, runs: int) -> Tuple[float, Dict[str, int]]:
+    """Best total import time in ms over several runs, and cumulative µs per module from that run"""
+    best_total = None
+    best_modules: Dict[str, int] = {}
+    env = {**os.environ, "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "importtime-check")}
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_ROOT,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+        modules: Dict[str, int] = {}
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            try:
+                modules[name.strip()] = int(cumulative)
+            except ValueError:
+                continue  # the header row
+        total = modules.get(module, 0) / 1000
+        if best_total is None or total < best_total:
+            best_total, best_modules = total, modules
+    return best_total or 0.0, best_modules
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Profile application import time")
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest run is reported")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--budget-ms", type=float, default=0, help="fail above this total (0 disables)")
+    args = parser.parse_args()
+
+    total, modules = profile_import(args.module, args.runs)
+
+    slowest: List[Tuple[str, int]] = sorted(
+        ((name, micros) for name, micros in modules.items() if "." not in name.lstrip()),
+        key=lambda item: item[1],
+        reverse=True
+    )[:args.top]
+    print(f"import {args.module}: {total:.1f} ms, {len(modules)} modules")
+    for name, micros in slowest:
+        print(f"{name:>30}: {micros / 1000:8.1f} ms")
+
+    failures = []
+    eager = [name for name in DEFERRED_MODULES if name in modules]
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if args.budget_ms and total > args.budget_ms:
+        failures.append(f"{total:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
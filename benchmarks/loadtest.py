@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Load test the diagnosis API against a local fake Groq/gTTS upstream
+
+Starts benchmarks.fake_upstream and the application (via benchmarks.stub_app),
+drives /api/diagnosis/analyze, /transcribe and /audio-response at a fixed
+concurrency with the bundled sample images and MP3s, and writes the results to
+benchmarks/results/ as JSON so runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.loadtest --workers 2 --concurrency 16 --requests 200
+    python -m benchmarks.loadtest --latency-ms 1500 --error-rate 0.05 --scenarios analyze
+    python -m benchmarks.loadtest --target http://localhost:8000 --requests 50
+    python -m benchmarks.loadtest --compare results/old.json results/new.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+SAMPLE_IMAGES = [
+    ("acne.jpg", "image/jpeg"),
+    ("acne2.jpg", "image/jpeg"),
+    ("skin_rash.jpg", "image/jpeg"),
+    ("dandruff-optimized.webp", "image/webp")
+]
+SAMPLE_AUDIO = [
+    "patient_voice_test.mp3",
+    "patient_voice_test_for_patient.mp3"
+]
+SAMPLE_SYMPTOMS = [
+    "Itchy red bumps on my cheek for a week",
+    "Flaky scalp that gets worse in winter",
+    None
+]
+SAMPLE_TEXTS = [
+    "Based on what I observe, this appears to be mild acne. Wash twice a day with a gentle cleanser. See a dermatologist if it persists.",
+    "Based on what I observe, this looks like seborrheic dermatitis. An anti-dandruff shampoo with ketoconazole may help. Consult a doctor if it spreads.",
+    "Based on what I observe, the rash may be contact dermatitis. Avoid the suspected irritant and apply a fragrance-free moisturizer."
+]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def read_file(name: str) -> bytes:
+    with open(os.path.join(REPO_ROOT, name), "rb") as f:
+        return f.read()
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MiB (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of a process (Linux only)"""
+    children = []
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                if int(fields[1]) == pid:
+                    children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    except OSError:
+        pass
+    return children
+
+def worker_memory(server: Optional[subprocess.Popen]) -> List[Dict[str, Any]]:
+    """RSS of the server process and each of its workers"""
+    if server is None:
+        return []
+    pids = [server.pid] + child_pids(server.pid)
+    return [{"pid": pid, "rss_mb": rss_mb(pid)} for pid in pids if rss_mb(pid) is not None]
+
+def wait_for(url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+class Scenario:
+    """One endpoint and the rotation of request payloads sent to it"""
+
+    def __init__(self, name: str, path: str, build: Callable[[int], Dict[str, Any]]):
+        self.name = name
+        self.path = path
+        self.build = build
+
+def build_scenarios(no_cache: bool) -> Dict[str, Scenario]:
+    images = [(name, read_file(name), mime) for name, mime in SAMPLE_IMAGES]
+    audio = [(name, read_file(name)) for name in SAMPLE_AUDIO]
+
+    def analyze(index: int) -> Dict[str, Any]:
+        name, data, mime = images[index % len(images)]
+        symptoms = SAMPLE_SYMPTOMS[index % len(SAMPLE_SYMPTOMS)]
+        form = {"no_cache": "true" if no_cache else "false"}
+        if symptoms:
+            form["symptoms"] = symptoms
+        return {"files": {"file": (name, data, mime)}, "data": form}
+
+    def transcribe(index: int) -> Dict[str, Any]:
+        name, data = audio[index % len(audio)]
+        return {"files": {"file": (name, data, "audio/mpeg")}}
+
+    def audio_response(index: int) -> Dict[str, Any]:
+        text = SAMPLE_TEXTS[index % len(SAMPLE_TEXTS)]
+        if no_cache:
+            # Make every text unique so the TTS cache cannot answer
+            text = f"{text} Reference {index}."
+        return {"data": {"text": text}}
+
+    return {
+        "analyze": Scenario("analyze", "/api/diagnosis/analyze", analyze),
+        "transcribe": Scenario("transcribe", "/api/diagnosis/transcribe", transcribe),
+        "audio-response": Scenario("audio-response", "/api/diagnosis/audio-response", audio_response)
+    }
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    total: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` clients issue `total` requests between them"""
+    counter = itertools.count()
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    bytes_received = 0
+
+    async def client_loop() -> None:
+        nonlocal bytes_received
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post(scenario.path, **scenario.build(index))
+                bytes_received += len(response.content)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": ok,
+        "statuses": dict(statuses),
+        "duration_s": round(elapsed, 3),
+        "requests_per_s": round(total / elapsed, 2),
+        "ok_per_s": round(ok / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1),
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p90": round(percentile(latencies, 90) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1)
+        },
+        "bytes_received": bytes_received
+    }
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=REPO_ROOT,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL if not os.getenv("BENCH_VERBOSE") else None
+    )
+
+def stop_process(process: Optional[subprocess.Popen]) -> None:
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    upstream = server = None
+    target = args.target
+    # Per-run SQLite stores, so state from earlier runs or a live server never leaks in
+    state_dir = tempfile.mkdtemp(prefix="ai_doctor_bench_")
+    try:
+        if target is None:
+            upstream_port, app_port = free_port(), free_port()
+            upstream = start_process(
+                ["-m", "benchmarks.fake_upstream", "--port", str(upstream_port),
+                 "--latency-ms", str(args.latency_ms),
+                 "--latency-sigma", str(args.latency_sigma),
+                 "--error-rate", str(args.error_rate),
+                 "--rate-limit-rate", str(args.rate_limit_rate),
+                 "--token-delay-ms", str(args.token_delay_ms)],
+                env={}
+            )
+            upstream_url = f"http://127.0.0.1:{upstream_port}"
+            wait_for(f"{upstream_url}/openai/v1/models")
+
+            server = start_process(
+                ["-m", "uvicorn", "benchmarks.stub_app:app",
+                 "--host", "127.0.0.1", "--port", str(app_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                env={
+                    "GROQ_API_KEY": "bench-key",
+                    "GROQ_BASE_URL": upstream_url,
+                    "BENCH_TTS_URL": upstream_url,
+                    "DEBUG": "false",
+                    # All load comes from 127.0.0.1, so per-client limits would measure the limiter
+                    "RATE_LIMIT_ENABLED": "false",
+                    "RATE_LIMIT_STORE_PATH": os.path.join(state_dir, "rate_limits.sqlite3"),
+                    "RESULT_STORE_PATH": os.path.join(state_dir, "results.sqlite3"),
+                    "JOB_STORE_PATH": os.path.join(state_dir, "jobs.sqlite3")
+                }
+            )
+            target = f"http://127.0.0.1:{app_port}"
+            wait_for(f"{target}/health/")
+
+        scenarios = build_scenarios(no_cache=not args.use_cache)
+        results: Dict[str, Any] = {}
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=target, timeout=args.timeout, limits=limits) as client:
+            for name in args.scenarios:
+                scenario = scenarios[name]
+                # Warm connections, caches and worker pools before measuring
+                for index in range(min(args.concurrency, 4)):
+                    try:
+                        await client.post(scenario.path, **scenario.build(index))
+                    except httpx.HTTPError:
+                        pass
+                results[name] = await run_scenario(client, scenario, args.requests, args.concurrency)
+                print(format_result(name, results[name]))
+
+        return {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {
+                "target": args.target or "local",
+                "workers": args.workers,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "use_cache": args.use_cache,
+                "upstream": {
+                    "latency_ms": args.latency_ms,
+                    "latency_sigma": args.latency_sigma,
+                    "error_rate": args.error_rate,
+                    "rate_limit_rate": args.rate_limit_rate,
+                    "token_delay_ms": args.token_delay_ms
+                }
+            },
+            "scenarios": results,
+            "memory": worker_memory(server)
+        }
+    finally:
+        stop_process(server)
+        stop_process(upstream)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+def format_result(name: str, result: Dict[str, Any]) -> str:
+    latency = result["latency_ms"]
+    return (
+        f"{name:>15}: {result['requests_per_s']:>7.2f} req/s  "
+        f"p50 {latency['p50']:>8.1f} ms  p90 {latency['p90']:>8.1f} ms  "
+        f"p99 {latency['p99']:>8.1f} ms  statuses {result['statuses']}"
+    )
+
+def compare(old_path: str, new_path: str) -> int:
+    """Print throughput and latency deltas between two saved runs"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    for name, current in new["scenarios"].items():
+        previous = old["scenarios"].get(name)
+        if previous is None:
+            continue
+        def delta(a: float, b: float) -> str:
+            return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+        print(
+            f"{name:>15}: req/s {previous['requests_per_s']} -> {current['requests_per_s']} "
+            f"({delta(previous['requests_per_s'], current['requests_per_s'])})  "
+            f"p99 {previous['latency_ms']['p99']} -> {current['latency_ms']['p99']} ms "
+            f"({delta(previous['latency_ms']['p99'], current['latency_ms']['p99'])})"
+        )
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the AI Doctor API")
+    parser.add_argument("--scenarios", nargs="+", default=["analyze", "transcribe", "audio-response"],
+                        choices=["analyze", "transcribe", "audio-response"])
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app under test")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--use-cache", action="store_true", help="allow result/TTS cache hits")
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay-ms", type=float, default=15)
+    parser.add_argument("--target", help="benchmark an already running server instead of spawning one")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<time>-<rev>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    result = asyncio.run(run_benchmark(args))
+    for entry in result["memory"]:
+        print(f"{'memory':>15}: pid {entry['pid']} rss {entry['rss_mb']} MiB")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{result['revision'] or 'unknown'}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
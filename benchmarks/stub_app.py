@@ -0,0 +1,17 @@
+"""
+Benchmark entrypoint: the real application with gTTS pointed at the fake upstream
+
+The Groq client already honours GROQ_BASE_URL; gTTS has no such setting, so its
+URL builder is redirected to BENCH_TTS_URL before the app is imported.
+"""
+import os
+
+import gtts.tts
+
+_tts_url = os.environ.get("BENCH_TTS_URL")
+if _tts_url:
+    gtts.tts._translate_url = lambda tld="com", path="": f"{_tts_url.rstrip('/')}/{path}"
+
+from main import app  # noqa: E402
+
+__all__ = ["app"]
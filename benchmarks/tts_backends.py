@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compare latency and throughput of the text-to-speech backends
+
+Usage:
+    python -m benchmarks.tts_backends
+    python -m benchmarks.tts_backends --backends gtts espeak --runs 10 --concurrency 4 --json tts.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from app.services.tts_backends import TTS_BACKENDS, create_tts_backend
+
+SAMPLE_SENTENCES = [
+    "Based on what I observe, this appears to be mild inflammatory acne on the cheek.",
+    "Wash the area twice a day with a gentle cleanser and avoid picking at the spots.",
+    "An over-the-counter benzoyl peroxide gel may help reduce the redness within a few weeks.",
+    "Please consult a dermatologist if the breakouts become painful or leave scars."
+]
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def bench_backend(name: str, runs: int, concurrency: int) -> Dict[str, Any]:
+    """Measure sequential latency and concurrent throughput for one backend"""
+    backend = create_tts_backend(name)
+
+    # Warm up once so binary lookup and DNS/TLS setup are not measured
+    backend.synthesize("Warm up.")
+
+    latencies = []
+    audio_bytes = 0
+    for _ in range(runs):
+        for sentence in SAMPLE_SENTENCES:
+            start = time.perf_counter()
+            audio_bytes += len(backend.synthesize(sentence))
+            latencies.append(time.perf_counter() - start)
+
+    jobs = SAMPLE_SENTENCES * runs
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(backend.synthesize, jobs))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "backend": name,
+        "media_type": backend.media_type,
+        "sentences": len(latencies),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1),
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1)
+        },
+        "throughput_sentences_per_s": round(len(jobs) / elapsed, 2),
+        "concurrency": concurrency,
+        "avg_audio_bytes": audio_bytes // len(latencies)
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(TTS_BACKENDS))
+    parser.add_argument("--runs", type=int, default=3, help="passes over the sample sentences")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.backends:
+        try:
+            result = bench_backend(name, args.runs, args.concurrency)
+        except Exception as e:
+            print(f"{name:>8}: skipped ({e})", file=sys.stderr)
+            continue
+        results.append(result)
+        latency = result["latency_ms"]
+        print(
+            f"{name:>8}: p50 {latency['p50']:>7.1f} ms  p95 {latency['p95']:>7.1f} ms  "
+            f"max {latency['max']:>7.1f} ms  "
+            f"{result['throughput_sentences_per_s']:>6.2f} sentences/s @ {args.concurrency}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 0 if results else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
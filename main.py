@@ -2,6 +2,7 @@
 AI Doctor - Main FastAPI Application
 Enhanced with proper structure and modern UI
 """
+import asyncio
 import os
 import logging
 from contextlib import asynccontextmanager
@@ -10,15 +11,19 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
+from fastapi.exception_handlers import http_exception_handler
 
 # Import application modules
 from app.core.config import settings
 from app.core.exceptions import create_http_exception
+from app.core.middleware import MetricsMiddleware
 from app.api.health import router as health_router
 from app.api.diagnosis import router as diagnosis_router
-from app.services.file_service import file_service
-from app.services.audio_service import audio_service
+from app.api.metrics import router as metrics_router
+from app.api.dependencies import close_services, warm_services
+from app.services.janitor_service import janitor_service
+from app.services.job_service import job_service
 
 # Configure logging
 logging.basicConfig(
@@ -37,14 +42,24 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.upload_dir, exist_ok=True)
     os.makedirs("app/static/images", exist_ok=True)
     
-    # Cleanup old files on startup
-    file_service.cleanup_old_files()
+    # Keep the upload directory bounded while the app runs
+    janitor_service.manage(settings.upload_dir, settings.upload_max_age, settings.upload_max_bytes)
+    await janitor_service.start()
+    
+    # Open Groq connections in the background so startup (and health probes) need not wait
+    warm = asyncio.create_task(warm_services())
+    
+    # Start background job workers
+    await job_service.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down AI Doctor application")
-    audio_service.cleanup_temp_files()
+    await job_service.stop(drain_timeout=settings.graceful_timeout)
+    await janitor_service.stop()
+    warm.cancel()
+    await close_services()
 
 # Create FastAPI application
 app = FastAPI(
@@ -53,6 +68,7 @@ app = FastAPI(
     description="AI-powered medical diagnosis from skin images with voice support",
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -67,6 +83,9 @@ app.add_middleware(
 
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+# Outermost, so timings include the other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -76,11 +95,15 @@ templates = Jinja2Templates(directory="app/templates")
 # Include routers
 app.include_router(health_router)
 app.include_router(diagnosis_router)
+app.include_router(metrics_router)
 
 # Exception handlers
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc: HTTPException):
     """Handle 404 errors"""
+    # API clients get the JSON error detail, e.g. for unknown job IDs
+    if request.url.path.startswith("/api/"):
+        return await http_exception_handler(request, exc)
     return templates.TemplateResponse(
         "404.html",
         {"request": request, "app_name": settings.app_name},
@@ -133,7 +156,9 @@ async def api_info():
             "health": "/health/",
             "diagnosis": "/api/diagnosis/analyze",
             "audio": "/api/diagnosis/audio-response",
-            "transcribe": "/api/diagnosis/transcribe"
+            "transcribe": "/api/diagnosis/transcribe",
+            "jobs": "/api/diagnosis/jobs/{job_id}",
+            "metrics": "/metrics"
         }
     }
 
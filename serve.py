@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+AI Doctor - Production Server
+Multi-worker launcher; use run.py or start.py for development with auto-reload
+"""
+import importlib.util
+import logging
+import os
+import sys
+
+from app.core.config import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("serve")
+
+def worker_count() -> int:
+    """Configured worker count, or one per CPU core this process may use"""
+    if settings.workers > 0:
+        return settings.workers
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def event_loop() -> str:
+    """uvloop when installed (not on Windows), otherwise asyncio"""
+    return "uvloop" if _available("uvloop") and sys.platform != "win32" else "asyncio"
+
+def http_protocol() -> str:
+    """httptools when installed, otherwise h11"""
+    return "httptools" if _available("httptools") else "h11"
+
+def serve_gunicorn(workers: int) -> None:
+    """Gunicorn master with the app preloaded, so workers fork with imports already done"""
+    from gunicorn.app.base import BaseApplication
+    from uvicorn_worker import UvicornWorker
+
+    class ProductionWorker(UvicornWorker):
+        CONFIG_KWARGS = {
+            "loop": event_loop(),
+            "http": http_protocol(),
+            # Finish in-flight requests (and the model calls behind them) on SIGTERM
+            "timeout_graceful_shutdown": int(settings.graceful_timeout)
+        }
+
+    class ProductionApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{settings.host}:{settings.port}",
+                "workers": workers,
+                "worker_class": ProductionWorker,
+                "preload_app": True,
+                "backlog": settings.server_backlog,
+                "keepalive": settings.keepalive_timeout,
+                "max_requests": settings.max_requests,
+                "max_requests_jitter": settings.max_requests_jitter,
+                # Request drain plus background job drain, then the worker is killed
+                "graceful_timeout": int(settings.graceful_timeout * 2 + 5),
+                "accesslog": "-"
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    ProductionApplication().run()
+
+def serve_uvicorn(workers: int) -> None:
+    """uvicorn's own process manager, for hosts without gunicorn (e.g. Windows)"""
+    import uvicorn
+
+    # uvicorn has no jitter, so every worker recycles after the same request count
+    uvicorn.run(
+        "main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.keepalive_timeout,
+        limit_max_requests=settings.max_requests or None,
+        timeout_graceful_shutdown=int(settings.graceful_timeout),
+        reload=False,
+        log_level="info"
+    )
+
+def main() -> int:
+    """Start the production server"""
+    if not settings.groq_api_key:
+        logger.error("GROQ_API_KEY not configured. Please set it in your .env file")
+        return 1
+
+    workers = worker_count()
+    use_gunicorn = (
+        _available("gunicorn") and _available("uvicorn_worker") and sys.platform != "win32"
+    )
+    logger.info(
+        f"Starting {settings.app_name} on {settings.host}:{settings.port} with {workers} workers "
+        f"({'gunicorn' if use_gunicorn else 'uvicorn'}, {event_loop()}, {http_protocol()})"
+    )
+    if use_gunicorn:
+        serve_gunicorn(workers)
+    else:
+        serve_uvicorn(workers)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())